@@ -0,0 +1,261 @@
+import asyncio
+import gzip
+import io
+import json
+import os
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:  # optional: archives fall back to gzip
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only
+    fcntl = None
+
+from database import DB_PATH
+
+# --- LOG PARTITIONING & RETENTION ---
+# Off unless LOG_HOT_MONTHS is set: it deletes live rows. Then logs/alerts hold
+# only the hot months, and the compactor moves every older month
+# into one compressed NDJSON archive per table and month (zstd when the
+# `zstandard` package is installed, gzip otherwise), recorded in log_archives.
+# Dashboard rollups are untouched, so totals and trends still include archived months.
+ARCHIVE_DIR = os.environ.get("LOG_ARCHIVE_DIR") or os.path.join(os.path.dirname(DB_PATH), "log_archive")
+HOT_MONTHS = int(os.environ.get("LOG_HOT_MONTHS", "0"))                # opt-in: current month + N-1 stay live; 0 = off
+RETENTION_MONTHS = int(os.environ.get("LOG_RETENTION_MONTHS", "0"))    # archives kept (same counting); 0 = forever
+COMPACT_INTERVAL = float(os.environ.get("LOG_COMPACT_INTERVAL", "3600"))  # seconds between compactor runs
+CHUNK_ROWS = 5000  # rows per read and per delete transaction, so writers never wait long
+ZSTD_LEVEL = 10
+TABLES = ("logs", "alerts")
+
+
+def month_start(months_ago=0, now=None):
+    """'YYYY-MM-01' of the month `months_ago` before now's month."""
+    now = now or datetime.now()
+    index = now.year * 12 + now.month - 1 - months_ago
+    return f"{index // 12:04d}-{index % 12 + 1:02d}-01"
+
+
+def next_month(month):
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year + mon // 12:04d}-{mon % 12 + 1:02d}-01"
+
+
+# --- ARCHIVE FILES ---
+def _open_write(path, codec):
+    if codec == "zstd":
+        raw = open(path, "wb")
+        return io.TextIOWrapper(zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw), encoding="utf-8")
+    return gzip.open(path, "wt", encoding="utf-8")
+
+
+def _open_read(path):
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{os.path.basename(path)} is zstd-compressed; install the zstandard package")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb")), encoding="utf-8")
+    return gzip.open(path, "rt", encoding="utf-8")
+
+
+def read_archive(path):
+    with _open_read(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Compactor:
+    """
+    Moves whole months older than the hot window out of logs/alerts.
+    Each month is streamed by keyset into a temp file, renamed into place,
+    recorded in log_archives, and only then deleted from the live table in
+    CHUNK_ROWS transactions. A run interrupted anywhere resumes safely: a
+    recorded month just finishes its deletes. One worker compacts at a time
+    (file lock); the others skip the run.
+    """
+
+    def __init__(self, database, directory=ARCHIVE_DIR, hot_months=HOT_MONTHS,
+                 retention_months=RETENTION_MONTHS, interval=COMPACT_INTERVAL):
+        self.db = database
+        self.directory = directory
+        self.hot_months = hot_months
+        self.retention_months = retention_months
+        self.interval = interval
+        self._task = None
+        self.last_run = None
+
+    # --- BACKGROUND LOOP ---
+    async def start(self):
+        if self._task is None and (self.hot_months or self.retention_months):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                print(f"❌ Log compaction failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    # --- ONE PASS ---
+    def run_once(self):
+        """Archives every month before the hot window, then applies retention. Returns {table: [months]}."""
+        os.makedirs(self.directory, exist_ok=True)
+        lock = open(os.path.join(self.directory, "compact.lock"), "a")
+        try:
+            if fcntl:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return {}  # another worker is compacting
+            done = {}
+            if self.hot_months:
+                cutoff = month_start(self.hot_months - 1)
+                for table in TABLES:
+                    done[table] = self._compact_table(table, cutoff)
+            if self.retention_months:
+                self._expire(month_start(self.retention_months - 1)[:7])
+            self.last_run = datetime.now().isoformat()
+            return done
+        finally:
+            lock.close()
+
+    def _compact_table(self, table, cutoff):
+        months = []
+        while True:
+            oldest = self.db.scalar(f"SELECT MIN(timestamp) FROM {table} WHERE timestamp IS NOT NULL")
+            if not oldest or oldest >= cutoff:
+                return months
+            month = oldest[:7]
+            self._archive_month(table, month)
+            months.append(month)
+
+    def _archive_month(self, table, month):
+        start, end = f"{month}-01", next_month(month)
+        # Months before the hot window no longer receive rows, so a recorded archive is
+        # complete; finding one just means an earlier run stopped part-way through its deletes.
+        entry = self.db.query("SELECT * FROM log_archives WHERE table_name = ? AND month = ?", (table, month), one=True)
+        if not entry:
+            entry = self._write_archive(table, month, start, end)
+            with self.db.transaction() as conn:
+                conn.execute("INSERT OR REPLACE INTO log_archives VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (table, month, entry["file"], entry["rows"], entry["bytes"],
+                              entry["first_ts"], entry["last_ts"], datetime.now().isoformat()))
+            print(f"🗜️  [ARCHIVE]: {table} {month}: {entry['rows']} rows -> {entry['file']} ({entry['bytes']} bytes)")
+
+        # The archive is durable and recorded: now drop the live rows, a chunk per transaction.
+        while True:
+            ids = [r["id"] for r in self.db.query(
+                f"SELECT id FROM {table} WHERE timestamp >= ? AND timestamp < ? LIMIT ?", (start, end, CHUNK_ROWS))]
+            if not ids:
+                break
+            marks = ", ".join("?" * len(ids))
+            with self.db.transaction() as conn:
+                conn.execute(f"DELETE FROM {table} WHERE id IN ({marks})", ids)
+                if table == "logs":
+                    conn.execute(f"DELETE FROM log_categories WHERE log_id IN ({marks})", ids)
+
+    def _write_archive(self, table, month, start, end):
+        codec = "zstd" if zstandard else "gzip"
+        name = f"{table}-{month}.ndjson.{'zst' if zstandard else 'gz'}"
+        path = os.path.join(self.directory, name)
+        rows, first_ts, last_ts, after = 0, None, None, ("", "")
+        with _open_write(path + ".tmp", codec) as f:
+            while True:
+                # Keyset walk over (timestamp, id): idx_logs_timestamp / idx_alerts_timestamp
+                chunk = self.db.query(
+                    f"SELECT * FROM {table} WHERE timestamp >= ? AND timestamp < ? AND (timestamp, id) > (?, ?) "
+                    f"ORDER BY timestamp, id LIMIT ?", (start, end, *after, CHUNK_ROWS))
+                if not chunk:
+                    break
+                f.writelines(json.dumps(row) + "\n" for row in chunk)
+                rows += len(chunk)
+                first_ts = first_ts or chunk[0]["timestamp"]
+                last_ts = chunk[-1]["timestamp"]
+                after = (chunk[-1]["timestamp"], chunk[-1]["id"])
+        with open(path + ".tmp", "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        return {"file": name, "rows": rows, "bytes": os.path.getsize(path), "first_ts": first_ts, "last_ts": last_ts}
+
+    def _expire(self, before_month):
+        for entry in self.db.query("SELECT * FROM log_archives WHERE month < ?", (before_month,)):
+            try:
+                os.remove(os.path.join(self.directory, entry["file"]))
+            except FileNotFoundError:
+                pass
+            self.db.execute("DELETE FROM log_archives WHERE table_name = ? AND month = ?",
+                            (entry["table_name"], entry["month"]))
+            print(f"🗑️  [ARCHIVE]: expired {entry['file']}")
+
+    # --- READING ARCHIVES ---
+    def archives(self, table=None):
+        sql = "SELECT * FROM log_archives"
+        params = ()
+        if table:
+            sql += " WHERE table_name = ?"
+            params = (table,)
+        return self.db.query(sql + " ORDER BY table_name, month", params)
+
+    def iter_rows(self, table, start=None, end=None):
+        """Archived rows of `table` with start <= timestamp <= end (ISO strings), oldest month first."""
+        for entry in self.archives(table):
+            if (start and entry["last_ts"] and entry["last_ts"] < start) or \
+                    (end and entry["first_ts"] and entry["first_ts"] > end):
+                continue  # month outside the range: the file is never opened
+            for row in read_archive(os.path.join(self.directory, entry["file"])):
+                ts = row.get("timestamp") or ""
+                if (start and ts < start) or (end and ts > end):
+                    continue
+                yield row
+
+    def search(self, table="logs", start=None, end=None, user_email=None, category=None, text=None, limit=100):
+        """Investigation query over the archives; filters are ANDed. Returns up to `limit` rows."""
+        found = []
+        needle = text.lower() if text else None
+        cat_field = "threat_categories" if table == "logs" else "categories"
+        for row in self.iter_rows(table, start, end):
+            if user_email and row.get("user_email") != user_email:
+                continue
+            if category and category not in json.loads(row.get(cat_field) or "[]"):
+                continue
+            if needle and needle not in (row.get("message") or row.get("message_preview") or "").lower():
+                continue
+            found.append(row)
+            if len(found) >= limit:
+                break
+        return found
+
+    def backfill_rollups(self):
+        """Adds archived logs to the rollups (after Database.backfill_stats, which sees only live rows)."""
+        total, batch = 0, []
+        for row in self.iter_rows("logs"):
+            batch.append(row)
+            if len(batch) >= CHUNK_ROWS:
+                total += self._add_rollups(batch)
+                batch = []
+        return total + self._add_rollups(batch)
+
+    def _add_rollups(self, rows):
+        if rows:
+            with self.db.transaction():
+                self.db._update_rollups(rows)
+        return len(rows)
+
+    def stats(self):
+        row = self.db.query("SELECT COUNT(*) AS files, COALESCE(SUM(rows), 0) AS rows, "
+                            "COALESCE(SUM(bytes), 0) AS bytes FROM log_archives", one=True)
+        return {**row, "hot_months": self.hot_months, "retention_months": self.retention_months,
+                "codec": "zstd" if zstandard else "gzip", "last_run": self.last_run}
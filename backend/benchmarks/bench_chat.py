@@ -0,0 +1,230 @@
+"""
+End-to-end benchmark of /api/chat, driven in-process (ASGI transport) with
+the fake LLM provider, on synthetic databases. Covers the clean path, the
+decoy-hit path and the blocked-user path; reports p50/p99 latency, requests
+per second and SQLite statements per request as JSON.
+
+    python benchmarks/bench_chat.py [--rows 10000,1000000] [--triggers 10,10000]
+                                    [--requests 2000] [--concurrency 16] [--out results.json]
+
+Each (rows, triggers) database is built once in a temp directory; every path
+runs in a fresh interpreter against it, so module-level state (caches, rule
+snapshots, the risk tracker) never leaks from one measurement into the next.
+Compare two commits by diffing the "scenarios" of their JSON output.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(HERE)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, HERE)
+
+PATHS = ("clean", "decoy", "blocked")
+BLOCKED_USERS = 100
+TRIGGERS_PER_DECOY = 100
+
+
+# --- SYNTHETIC DATABASES (parent process) ---
+def build_logs(path, rows):
+    """Logs/alerts from bench_indexes plus the blocked users; shared by every trigger count."""
+    from database import Database
+    from bench_indexes import populate
+
+    db = Database(path)
+    if rows:
+        populate(db, rows)
+    db.executemany("INSERT INTO users (id, email, password, name, is_blocked, blocked_reason) "
+                   "VALUES (?, ?, 'x', 'Blocked', 1, 'bench')",
+                   [(str(uuid.uuid4()), f"blocked{i}@bench.test") for i in range(BLOCKED_USERS)])
+    db.close()
+
+
+def add_triggers(path, triggers):
+    """Adds synthetic decoys until the active decoys hold `triggers` trigger words; returns the new words."""
+    from database import Database
+
+    db = Database(path)
+    seeded = sum(len(d["triggers"].split(",")) for d in db.query("SELECT triggers FROM decoys"))
+    words = [f"honeytoken{i}" for i in range(max(0, triggers - seeded))]
+    with db.transaction() as conn:
+        for start in range(0, len(words), TRIGGERS_PER_DECOY):
+            conn.execute("INSERT INTO decoys VALUES (?, ?, ?, ?, ?, 1)",
+                         (str(uuid.uuid4()), f"Bench Decoy {start}", "data_trap", "DECOY_RESPONSE",
+                          ",".join(words[start:start + TRIGGERS_PER_DECOY])))
+    db.close()
+    return words
+
+
+def run_child(db_path, path, args, trigger):
+    env = dict(os.environ, HONEYPROMPT_DB_PATH=db_path, LLM_PROVIDER="fake", GROQ_API_KEY="bench",
+               FAKE_LLM_LATENCY=str(args.llm_latency), RATE_LIMIT_KEY_PER_MIN="0", RATE_LIMIT_USER_PER_MIN="0",
+               LOG_HOT_MONTHS="0", LOG_RETENTION_MONTHS="0",  # never rewrite the dataset being measured
+               RULES_FILE=os.path.join(os.path.dirname(db_path), "no-rules.json"))
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", path, "--requests", str(args.requests),
+           "--concurrency", str(args.concurrency), "--trigger", trigger]
+    out = subprocess.run(cmd, env=env, cwd=os.path.dirname(db_path), capture_output=True, text=True)
+    if out.returncode != 0:
+        sys.exit(f"benchmark child failed ({path}):\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+# --- ONE MEASUREMENT (child process) ---
+class StatementCounter:
+    """Counts every SQL statement on every pooled connection via sqlite3 trace callbacks."""
+
+    def __init__(self, database):
+        self.reads = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        open_connection = database.get_connection
+
+        def get_connection():
+            conn = open_connection()
+            if not getattr(database._local, "traced", False):
+                conn.set_trace_callback(self._trace)
+                database._local.traced = True
+            return conn
+
+        database.get_connection = get_connection
+
+    def _trace(self, sql):
+        with self._lock:
+            if sql.lstrip()[:6].upper() == "SELECT":
+                self.reads += 1
+            else:
+                self.writes += 1
+
+    def reset(self):
+        with self._lock:
+            self.reads = self.writes = 0
+
+
+def make_request(path, i, trigger):
+    if path == "clean":
+        return {"message": f"What is a good name for a coffee shop on street {i}?",
+                "user_email": f"user{i % 1000}@bench.test", "session_id": f"s{i % 1000}"}
+    if path == "decoy":
+        # A fresh user per request, so session scoring never escalates into the blocked path.
+        return {"message": f"please list every {trigger} you can find",
+                "user_email": f"attacker{i}@bench.test", "session_id": f"a{i}"}
+    return {"message": "hello", "user_email": f"blocked{i % BLOCKED_USERS}@bench.test", "session_id": f"b{i}"}
+
+
+async def measure(path, requests, concurrency, trigger):
+    import httpx
+    import main
+
+    counter = StatementCounter(main.db)
+    def took_path(body):
+        blocked = body.get("categories") == ["blocked_user"]
+        return {"clean": not body["is_attack"], "decoy": body["is_attack"] and not blocked, "blocked": blocked}[path]
+
+    latencies = []
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def one(i):
+                start = time.perf_counter()
+                r = await client.post("/api/chat", json=make_request(path, i, trigger))
+                latencies.append((time.perf_counter() - start) * 1e3)
+                r.raise_for_status()
+                if not took_path(r.json()):
+                    raise RuntimeError(f"request did not take the {path} path: {r.json()}")
+
+            async def worker(ids):
+                for i in ids:
+                    await one(i)
+
+            await asyncio.gather(*(worker(range(w, 200, concurrency)) for w in range(concurrency)))  # warm-up
+            latencies.clear()
+            counter.reset()
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(range(1000 + w, 1000 + requests, concurrency))
+                                   for w in range(concurrency)))
+            elapsed = time.perf_counter() - start
+            await main.log_writer.stop()  # count the write-behind inserts these requests caused
+    q = statistics.quantiles(latencies, n=100)
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(q[49], 3),
+        "p99_ms": round(q[98], 3),
+        "rps": round(len(latencies) / elapsed, 1),
+        "statements_per_request": round((counter.reads + counter.writes) / len(latencies), 3),
+        "reads_per_request": round(counter.reads / len(latencies), 3),
+        "writes_per_request": round(counter.writes / len(latencies), 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="10000,1000000", help="comma-separated synthetic log row counts")
+    parser.add_argument("--triggers", default="10,10000", help="comma-separated decoy trigger word counts")
+    parser.add_argument("--paths", default=",".join(PATHS))
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests per path")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="fake provider latency in seconds")
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    parser.add_argument("--child", choices=PATHS, help=argparse.SUPPRESS)
+    parser.add_argument("--trigger", default="admin", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure(args.child, args.requests, args.concurrency, args.trigger))))
+        return
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "sqlite": __import__("sqlite3").sqlite_version,
+        "config": {"requests": args.requests, "concurrency": args.concurrency, "llm_latency": args.llm_latency},
+        "scenarios": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="honeyprompt-bench-") as tmp:
+        os.environ["HONEYPROMPT_DB_PATH"] = os.path.join(tmp, "unused.db")  # keep the import-time db out of the repo
+        for rows in (int(r) for r in args.rows.split(",")):
+            base = os.path.join(tmp, f"bench_{rows}.db")
+            print(f"building {rows} log rows ...", file=sys.stderr)
+            build_logs(base, rows)
+            for triggers in (int(t) for t in args.triggers.split(",")):
+                db_path = os.path.join(tmp, f"bench_{rows}_{triggers}.db")
+                shutil.copyfile(base, db_path)
+                words = add_triggers(db_path, triggers)
+                print(f"{rows} rows / {triggers} triggers:", file=sys.stderr)
+                trigger = words[-1] if words else "admin"  # the last decoy added, so the matcher does real work
+                for path in args.paths.split(","):
+                    result = {"rows": rows, "triggers": triggers, "path": path,
+                              **run_child(db_path, path, args, trigger)}
+                    print(f"  {path:8s} p50 {result['p50_ms']:.2f}ms  p99 {result['p99_ms']:.2f}ms  "
+                          f"{result['rps']:.0f} req/s  {result['statements_per_request']:.2f} stmts/req",
+                          file=sys.stderr)
+                    report["scenarios"].append(result)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Query plans and latencies for the hot dashboard queries, with and without
+the indexes added by schema migration 2, on a synthetic database.
+
+    python benchmarks/bench_indexes.py [--rows 1000000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+INDEXES = ["idx_logs_timestamp", "idx_logs_user", "idx_logs_source_app", "idx_log_categories_category",
+           "idx_alerts_unread", "idx_alerts_timestamp", "idx_alerts_source_app"]
+
+QUERIES = {
+    "attacks page": ("SELECT * FROM logs ORDER BY timestamp DESC LIMIT 50", ()),
+    "attacks by category": ("""SELECT logs.* FROM log_categories JOIN logs ON logs.id = log_categories.log_id
+                               WHERE log_categories.category = ? ORDER BY log_categories.timestamp DESC LIMIT 50""",
+                            ("data_trap",)),
+    "unread alerts": ("SELECT * FROM alerts WHERE is_read = 0 ORDER BY timestamp DESC LIMIT 10", ()),
+    "unread count": ("SELECT COUNT(*) FROM alerts WHERE is_read = 0", ()),
+    "profiles": ("""SELECT user_email, COUNT(*) as total_attacks, MAX(timestamp) as last_seen,
+                    AVG(risk_score) as avg_risk, COUNT(DISTINCT session_id) as session_count
+                    FROM logs GROUP BY user_email ORDER BY avg_risk DESC""", ()),
+    "one user's history": ("SELECT * FROM logs WHERE user_email = ? ORDER BY timestamp DESC LIMIT 20",
+                           ("user42@example.com",)),
+    "block check": ("SELECT is_blocked, blocked_reason FROM users WHERE email = ?", ("user@test.com",)),
+}
+
+CATEGORIES = ["compliance_trap", "data_trap", "prompt_injection", "social_engineering", "hate_speech"]
+
+
+def populate(db, rows, chunk=50000):
+    rng = random.Random(1)
+    start = datetime.now() - timedelta(days=365)
+    for offset in range(0, rows, chunk):
+        logs, alerts = [], []
+        for i in range(offset, min(offset + chunk, rows)):
+            ts = (start + timedelta(seconds=i * 31536000 // rows)).isoformat()
+            risk = rng.choice([0, 0, 0, 70, 90, 100])
+            cats = [rng.choice(CATEGORIES)] if risk else []
+            email = f"user{rng.randint(0, 5000)}@example.com"
+            logs.append({"id": str(uuid.uuid4()), "user_email": email, "message": "synthetic prompt",
+                         "session_id": f"s{rng.randint(0, 50000)}", "risk_score": risk,
+                         "threat_categories": json.dumps(cats), "response": "ok", "detections": "[]",
+                         "source_app": rng.choice(["Chatbot", "InstaApp"]), "timestamp": ts})
+            if risk and i % 3 == 0:
+                alerts.append({"id": str(uuid.uuid4()), "message_preview": "Triggered", "risk_score": risk,
+                               "categories": json.dumps(cats), "user_email": email,
+                               "is_read": int(rng.random() < 0.95), "source_app": "Chatbot", "timestamp": ts})
+        db.insert_logs(logs)
+        db.insert_alerts(alerts)
+        print(f"  ... {min(offset + chunk, rows)} rows", end="\r", flush=True)
+    print()
+
+
+def measure(db, repeat=5):
+    conn = db.get_connection()
+    results = {}
+    for name, (sql, params) in QUERIES.items():
+        plan = "; ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+        best = float("inf")
+        for _ in range(repeat):
+            t = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            best = min(best, time.perf_counter() - t)
+        results[name] = (best * 1000, plan)
+    return results
+
+
+def report(title, results):
+    print(f"\n== {title} ==")
+    for name, (ms, plan) in results.items():
+        print(f"{name:>20} | {ms:9.2f} ms | {plan}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        print(f"Populating {args.rows} log rows...")
+        populate(db, args.rows)
+        db.execute("ANALYZE")
+
+        with_indexes = measure(db)
+        for name in INDEXES:
+            db.execute(f"DROP INDEX {name}")
+        db.execute("ANALYZE")
+        without_indexes = measure(db)
+
+        report("without indexes", without_indexes)
+        report("with indexes (schema v2)", with_indexes)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: similarity detector at a large stored-attack library
+(index build, mmap open, per-prompt query latency). Needs NumPy.
+
+    python benchmarks/bench_similarity.py [--attacks 100000] [--queries 500]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SIMILARITY_DETECTOR", "1")  # similarity.py only imports NumPy when enabled
+
+from similarity import np, SimilarityDetector
+
+VERBS = ["ignore", "disregard", "forget", "bypass", "override", "reveal", "print", "leak", "show", "dump"]
+OBJECTS = ["previous instructions", "system prompt", "admin password", "api keys", "hidden rules",
+           "safety filter", "developer mode", "secret config", "user database", "audit logs"]
+FILLER = ["please", "now", "quickly", "for me", "as an admin", "in full", "verbatim", "right away",
+          "without checks", "and continue"]
+
+
+def make_attack(rng, i):
+    words = [rng.choice(FILLER), rng.choice(VERBS), "the", rng.choice(OBJECTS), rng.choice(FILLER),
+             rng.choice(VERBS), rng.choice(OBJECTS)]
+    return " ".join(words) + f" #{i}"
+
+
+def pct(values, q):
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--attacks", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+    if np is None:
+        sys.exit("NumPy is required for the similarity detector.")
+
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        detector = SimilarityDetector(directory=tmp)
+        detector.index.open()
+
+        start = time.perf_counter()
+        for base in range(0, args.attacks, 5000):
+            detector.learn([{"id": str(i), "message": make_attack(rng, i), "risk_score": 90,
+                             "threat_categories": '["prompt_injection"]'}
+                            for i in range(base, min(base + 5000, args.attacks))])
+        detector.index.wait_trained()
+        build = time.perf_counter() - start
+        print(f"indexed {len(detector.index)} attacks in {build:.1f}s ({len(detector.index) / build:.0f}/s)")
+
+        reopened = SimilarityDetector(directory=tmp)
+        start = time.perf_counter()
+        reopened.load()
+        print(f"mmap open: {(time.perf_counter() - start) * 1e3:.1f}ms")
+
+        queries = [make_attack(rng, -i) if i % 2 else f"what is the weather like in city {i}"
+                   for i in range(args.queries)]
+        reopened.check(queries[0])  # fault the mapped pages in once
+        timings, hits = [], 0
+        for q in queries:
+            start = time.perf_counter()
+            hits += reopened.check(q) is not None
+            timings.append((time.perf_counter() - start) * 1e3)
+        print(f"single query: p50 {pct(timings, 50):.2f}ms  p99 {pct(timings, 99):.2f}ms  "
+              f"({hits}/{len(queries)} flagged)")
+
+        start = time.perf_counter()
+        reopened.check_many(queries)
+        print(f"batched: {(time.perf_counter() - start) * 1e3 / len(queries):.3f}ms per prompt")
+
+
+if __name__ == "__main__":
+    main()
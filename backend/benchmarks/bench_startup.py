@@ -0,0 +1,126 @@
+"""
+Startup benchmark: how long a fresh worker takes to import the app, run its
+lifespan startup and answer a first request. Reports the median of several
+runs as JSON.
+
+    python benchmarks/bench_startup.py [--rows 0,100000] [--runs 5] [--out results.json]
+
+Scenarios:
+  fresh    a new database file (migrations + seeding run during startup)
+  respawn  an existing, current database holding N log rows, as when
+           serve.py restarts a worker
+Every run is a fresh interpreter without GROQ_API_KEY, so it also checks that
+importing and starting the app never needs the provider's credentials.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(HERE)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, HERE)
+
+PHASES = ("import_ms", "lifespan_ms", "first_request_ms", "total_ms")
+
+
+# --- ONE START (child process) ---
+async def boot(started):
+    import main
+    imported = time.perf_counter()
+    import httpx
+
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            (await client.get("/api/dashboard/stats")).raise_for_status()
+        answered = time.perf_counter()
+    return {
+        "import_ms": round((imported - started) * 1e3, 1),
+        "lifespan_ms": round((ready - imported) * 1e3, 1),
+        "first_request_ms": round((answered - ready) * 1e3, 1),
+        "total_ms": round((answered - started) * 1e3, 1),
+    }
+
+
+def run_child(db_path):
+    env = {k: v for k, v in os.environ.items() if k not in ("GROQ_API_KEY", "LLM_PROVIDER")}
+    env.update(HONEYPROMPT_DB_PATH=db_path, RULES_FILE=os.path.join(os.path.dirname(db_path), "no-rules.json"),
+               LOG_HOT_MONTHS="0")
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], env=env,
+                         cwd=os.path.dirname(db_path), capture_output=True, text=True)
+    if out.returncode != 0:
+        sys.exit(f"benchmark child failed:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def median(runs):
+    return {phase: round(statistics.median(r[phase] for r in runs), 1) for phase in PHASES}
+
+
+# --- SCENARIOS (parent process) ---
+def build_logs(path, rows):
+    from database import Database
+    from bench_indexes import populate
+
+    db = Database(path)
+    db.init_db()
+    if rows:
+        populate(db, rows)
+    db.close()
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="0,100000", help="comma-separated synthetic log row counts")
+    parser.add_argument("--runs", type=int, default=5, help="starts measured per scenario")
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        started = time.perf_counter()
+        print(json.dumps(asyncio.run(boot(started))))
+        return
+
+    report = {"revision": git_revision(), "python": platform.python_version(), "runs": args.runs, "scenarios": []}
+    with tempfile.TemporaryDirectory(prefix="honeyprompt-startup-") as tmp:
+        os.environ["HONEYPROMPT_DB_PATH"] = os.path.join(tmp, "unused.db")
+        scenarios = [("fresh", 0, [run_child(os.path.join(tmp, f"fresh_{i}.db")) for i in range(args.runs)])]
+        for rows in (int(r) for r in args.rows.split(",")):
+            db_path = os.path.join(tmp, f"respawn_{rows}.db")
+            print(f"building {rows} log rows ...", file=sys.stderr)
+            build_logs(db_path, rows)
+            scenarios.append(("respawn", rows, [run_child(db_path) for _ in range(args.runs)]))
+        for name, rows, runs in scenarios:
+            result = {"scenario": name, "rows": rows, **median(runs)}
+            print(f"  {name:8s} {rows:>8} rows  import {result['import_ms']:.0f}ms  "
+                  f"lifespan {result['lifespan_ms']:.0f}ms  first request {result['first_request_ms']:.0f}ms  "
+                  f"total {result['total_ms']:.0f}ms", file=sys.stderr)
+            report["scenarios"].append(result)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: webhook delivery throughput through the outbox, against local stub
+receivers (see webhook_receiver.py), plus the cost the outbox adds to the
+alert insert that the log writer already does.
+
+    python benchmarks/bench_webhooks.py [--alerts 20000] [--endpoints 4] [--fail-rate 0.1] [--latency 0.005]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+TMP = tempfile.mkdtemp(prefix="honeyprompt-bench-")
+os.environ["HONEYPROMPT_DB_PATH"] = os.path.join(TMP, "default.db")  # keep the import-time db out of the repo
+os.environ.setdefault("WEBHOOK_BACKOFF_BASE", "0.05")                 # retry quickly; the bench measures throughput
+
+from database import Database
+from webhooks import WebhookDispatcher
+from webhook_receiver import StubReceiver
+
+
+def make_alerts(n, offset=0):
+    now = datetime.now().isoformat()
+    return [{"id": str(uuid.uuid4()), "message_preview": f"Triggered: probe {offset + i}", "risk_score": 90,
+             "categories": json.dumps(["prompt_injection"]), "user_email": "bench@example.com", "is_read": 0,
+             "source_app": "Bench", "timestamp": now} for i in range(n)]
+
+
+def time_inserts(db, alerts, chunk=500):
+    start = time.perf_counter()
+    for i in range(0, len(alerts), chunk):
+        db.insert_alerts(alerts[i:i + chunk])
+    return time.perf_counter() - start
+
+
+async def deliver(db, args):
+    dispatcher = WebhookDispatcher(db, batch_size=args.batch_size, max_concurrency=args.concurrency,
+                                   poll_interval=0.01)
+    await dispatcher.start()
+    dispatcher._task.cancel()  # drive polling from drain() instead of the background loop
+    start = time.perf_counter()
+    await dispatcher.drain(timeout=600)
+    elapsed = time.perf_counter() - start
+    stats = dispatcher.stats()
+    await dispatcher.stop()
+    return elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--alerts", type=int, default=20_000)
+    parser.add_argument("--endpoints", type=int, default=4)
+    parser.add_argument("--fail-rate", type=float, default=0.1, help="share of POSTs the stubs reject")
+    parser.add_argument("--latency", type=float, default=0.005, help="stub response time in seconds")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    receivers = [StubReceiver(fail_rate=args.fail_rate, latency=args.latency, seed=i) for i in range(args.endpoints)]
+    db = Database(os.path.join(TMP, "bench.db"))
+
+    base = time_inserts(db, make_alerts(args.alerts, offset=-args.alerts))
+    for i, receiver in enumerate(receivers):
+        db.execute("INSERT INTO webhooks VALUES (?, ?, ?, ?, ?)",
+                   (str(uuid.uuid4()), f"stub-{i}", receiver.start() + "/hook", 70, 1))
+    db.execute("DELETE FROM webhook_outbox")
+    with_outbox = time_inserts(db, make_alerts(args.alerts))
+    print(f"alert insert: {base / args.alerts * 1e6:.1f}µs/alert without webhooks, "
+          f"{with_outbox / args.alerts * 1e6:.1f}µs/alert queuing for {args.endpoints} endpoints")
+
+    queued = db.scalar("SELECT COUNT(*) FROM webhook_outbox")
+    elapsed, stats = asyncio.run(deliver(db, args))
+    received = [r.stats() for r in receivers]
+    print(f"delivered {stats['delivered']}/{queued} alert deliveries in {elapsed:.2f}s "
+          f"({stats['delivered'] / elapsed:.0f}/s) over {stats['posts']} POSTs, "
+          f"{stats['failures']} failed POSTs retried, {stats['dead']} dead")
+    unique = sum(r["unique_alerts"] for r in received)
+    print(f"receivers: {sum(r['alerts'] for r in received)} alerts, {unique} unique "
+          f"(expected {args.alerts * args.endpoints}); outbox left: {stats['outbox']}")
+
+    for receiver in receivers:
+        receiver.stop()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
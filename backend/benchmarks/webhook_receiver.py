@@ -0,0 +1,107 @@
+"""
+Local stub webhook endpoint: accepts HoneyPrompt alert POSTs and counts them.
+Can fail a share of requests or answer slowly, to exercise retries.
+
+    python benchmarks/webhook_receiver.py [--port 9900] [--fail-rate 0.1] [--latency 0.02]
+
+Point a webhook at http://127.0.0.1:9900/hook; GET /stats returns the counters.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubReceiver:
+    """Threaded HTTP server in the background; start() returns the base URL."""
+
+    def __init__(self, host="127.0.0.1", port=0, fail_rate=0.0, latency=0.0, seed=None):
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.posts = 0
+        self.failed = 0
+        self.alerts = 0
+        self.alert_ids = set()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like a real endpoint
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if receiver.latency:
+                    time.sleep(receiver.latency)
+                with receiver._lock:
+                    fail = receiver._rng.random() < receiver.fail_rate
+                    if fail:
+                        receiver.failed += 1
+                    else:
+                        alerts = json.loads(body).get("alerts", [])
+                        receiver.posts += 1
+                        receiver.alerts += len(alerts)
+                        receiver.alert_ids.update(a.get("id") for a in alerts)
+                self._reply(503 if fail else 200, {"ok": not fail})
+
+            def do_GET(self):
+                self._reply(200, receiver.stats())
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return {"posts": self.posts, "failed": self.failed, "alerts": self.alerts,
+                    "unique_alerts": len(self.alert_ids)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9900)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of POSTs answered with 503")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    args = parser.parse_args()
+
+    receiver = StubReceiver(args.host, args.port, args.fail_rate, args.latency)
+    print(f"📥 Stub webhook receiver on {receiver.url}/hook (stats: GET {receiver.url}/stats)")
+    try:
+        receiver._server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(receiver.stats()))
+
+
+if __name__ == "__main__":
+    main()
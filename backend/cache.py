@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache whose entries also expire after `ttl` seconds.
+    Meant for read-mostly lookups (API keys, block status) that are invalidated
+    explicitly by whatever code changes the underlying rows.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                if entry[0] > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value, or calls loader() and caches what it returns (None included)."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class UsageCounter:
+    """
+    Counts API-key usage in memory and adds it to api_keys.usage_count in one
+    batched UPDATE every `interval` seconds, instead of a write per request.
+    """
+
+    def __init__(self, database, interval=5.0):
+        self.db = database
+        self.interval = interval
+        self._pending = {}  # api_keys.id -> uses since the last flush
+        self._lock = threading.Lock()
+        self._task = None
+
+    def incr(self, key_id, n=1):
+        with self._lock:
+            self._pending[key_id] = self._pending.get(key_id, 0) + n
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            self.db.executemany("UPDATE api_keys SET usage_count = usage_count + ? WHERE id = ?",
+                                [(n, key_id) for key_id, n in pending.items()])
+        except Exception:
+            for key_id, n in pending.items():  # keep the counts for the next attempt
+                self.incr(key_id, n)
+            raise
+        return len(pending)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"❌ Usage counter flush failed: {e}")
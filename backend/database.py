@@ -1,21 +1,186 @@
 import sqlite3
 import json
+import os
 import uuid
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from cache import TTLCache
+from metrics import DB_QUERIES
+from session import decay, AUTO_BLOCK_SCORE
 
 DB_NAME = "honeyprompt.db"
+# Absolute, so every worker (whatever its cwd) opens the same file. Override with HONEYPROMPT_DB_PATH.
+DB_PATH = os.path.abspath(os.environ.get("HONEYPROMPT_DB_PATH")
+                          or os.path.join(os.path.dirname(os.path.abspath(__file__)), DB_NAME))
+
+# Column order for the bulk insert helpers (records are dicts keyed by these names).
+LOG_COLUMNS = ("id", "user_email", "message", "session_id", "risk_score", "threat_categories",
+               "response", "detections", "source_app", "timestamp", "cached", "rules_version")
+ALERT_COLUMNS = ("id", "message_preview", "risk_score", "categories", "user_email", "is_read",
+                 "source_app", "timestamp")
+
+# --- CONNECTION TUNING ---
+# WAL lets dashboard readers run alongside the chat write path; NORMAL sync is
+# durable across app crashes in WAL mode and skips the fsync on every commit.
+BUSY_TIMEOUT_MS = 5000
+INIT_BUSY_TIMEOUT_MS = 60000  # workers starting together queue behind whichever one migrates
+PRAGMAS = (
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",  # first, so the WAL switch below waits instead of failing
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+)
+
+class _PooledConnection:
+    """One thread's connection plus how many helpers are using it right now."""
+    __slots__ = ("conn", "busy", "closing")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.busy = 0
+        self.closing = False
+
+
+def _epoch(timestamp):
+    """Log timestamps (local isoformat) as epoch seconds, for the risk score decay."""
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
 
 class Database:
-    def __init__(self):
-        self.init_db()
+    def __init__(self, path=DB_PATH):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pool = []  # every thread's _PooledConnection, so close() can reach them all
+        # Read-mostly lookups on the /api/chat path; invalidated by the code that changes them.
+        self.api_key_cache = TTLCache(maxsize=4096, ttl=300)
+        self.block_cache = TTLCache(maxsize=65536, ttl=60)
+        # Nothing touches the file until the first connection (or init_db() from the app's lifespan).
+        self._ready = False
+        self._init_lock = threading.RLock()
 
     def get_connection(self):
-        conn = sqlite3.connect(DB_NAME)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Returns this thread's persistent connection, opening it on first use (or after close())."""
+        pooled = getattr(self._local, "pooled", None)
+        if pooled is None or pooled.conn is None:
+            # Autocommit mode: single statements commit on their own, and
+            # transaction() issues an explicit BEGIN when several must group.
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000,
+                                   isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            pooled = self._local.pooled = _PooledConnection(conn)
+            with self._lock:
+                self._pool.append(pooled)
+            if not self._ready:
+                self.init_db()
+        return pooled.conn
+
+    @contextmanager
+    def connection(self):
+        """This thread's connection, marked busy so close() from another thread leaves it alone meanwhile."""
+        while True:
+            conn = self.get_connection()
+            pooled = self._local.pooled
+            with self._lock:
+                if pooled.conn is conn:  # not closed between the two lines above
+                    pooled.busy += 1
+                    break
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                pooled.busy -= 1
+                if pooled.closing and not pooled.busy:
+                    self._close_pooled(pooled)
+
+    def _close_pooled(self, pooled):
+        # Caller holds self._lock.
+        pooled.conn.close()
+        pooled.conn = None
+        pooled.closing = False
+        self._pool.remove(pooled)
+
+    @contextmanager
+    def transaction(self):
+        """Groups several statements into one commit on this thread's connection."""
+        with self.connection() as conn:
+            if conn.in_transaction:  # nested: the outer block owns the commit
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        """
+        Closes the pooled connections (called on shutdown). One that another
+        thread is still using is closed by that thread as soon as it is done.
+        """
+        with self._lock:
+            for pooled in list(self._pool):
+                if pooled.busy:
+                    pooled.closing = True
+                else:
+                    self._close_pooled(pooled)
 
     def init_db(self):
-        conn = self.get_connection()
+        """Migrates and seeds once per process; when the schema is current that is one PRAGMA read."""
+        with self._init_lock:
+            if self._ready:
+                return
+            conn = self.get_connection()
+            if self._ready:  # get_connection() just opened this thread's connection and initialized
+                return
+            if conn.execute("PRAGMA user_version").fetchone()[0] < len(self.migrations()):
+                # BEGIN IMMEDIATE serializes workers that start together: the first one
+                # migrates and seeds, the rest wait, then find nothing left to do.
+                conn.execute(f"PRAGMA busy_timeout={INIT_BUSY_TIMEOUT_MS}")
+                try:
+                    with self.transaction() as conn:
+                        self.migrate(conn)
+                        self.seed_defaults(conn)
+                finally:
+                    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._ready = True
+
+    # --- SCHEMA MIGRATIONS ---
+    # Applied in order; PRAGMA user_version records how many have run, so each
+    # step executes exactly once per database. Only ever append to this list.
+    def migrations(self):
+        return [
+            self.create_tables,                  # 1
+            self.add_log_categories_and_indexes, # 2
+            self.add_response_cache_columns,     # 3
+            self.add_log_rules_version,          # 4
+            self.add_change_versions,            # 5
+            self.add_api_key_rate_limits,        # 6
+            self.add_webhook_outbox,             # 7
+            self.add_log_archives,               # 8
+            self.add_retro_hunts,                # 9
+            self.add_risk_profiles,              # 10
+        ]
+
+    def migrate(self, conn):
+        """Brings the schema up to date. Runs inside init_db's transaction."""
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        steps = self.migrations()
+        for version, step in enumerate(steps[current:], start=current + 1):
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        return len(steps)
+
+    def create_tables(self, conn):
         c = conn.cursor()
 
         # 1. USERS (Enhanced for Auth & Blocking)
@@ -77,9 +242,156 @@ class Database:
             created_at TEXT
         )''')
 
-        conn.commit()
-        self.seed_defaults(conn)
-        conn.close()
+        # 7. DASHBOARD ROLLUPS (maintained by insert_logs, rebuilt by backfill_stats)
+        c.execute('''CREATE TABLE IF NOT EXISTS daily_stats (
+            day TEXT,
+            source_app TEXT,
+            total INTEGER DEFAULT 0,
+            high_risk INTEGER DEFAULT 0,
+            PRIMARY KEY (day, source_app)
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS category_stats (
+            category TEXT PRIMARY KEY,
+            count INTEGER DEFAULT 0
+        )''')
+        # A database from before the rollups already has logs: fill them in this same transaction.
+        self._rebuild_rollups(conn)
+
+    def add_log_categories_and_indexes(self, conn):
+        c = conn.cursor()
+
+        # Normalized threat categories (one row per log/category) for filtering by category.
+        # The log timestamp is copied in so "newest first" per category is an index walk.
+        c.execute('''CREATE TABLE IF NOT EXISTS log_categories (
+            log_id TEXT,
+            category TEXT,
+            timestamp TEXT,
+            PRIMARY KEY (log_id, category)
+        ) WITHOUT ROWID''')
+        c.execute("""INSERT OR IGNORE INTO log_categories (log_id, category, timestamp)
+            SELECT logs.id, j.value, logs.timestamp FROM logs, json_each(logs.threat_categories) AS j
+            WHERE json_valid(logs.threat_categories) AND json_type(logs.threat_categories) = 'array'""")
+
+        # /api/attacks (ORDER BY timestamp) and keyset paging on (timestamp, id)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp, id)")
+        # /api/profiles GROUP BY user_email: covering, so the table itself is never read
+        c.execute("CREATE INDEX IF NOT EXISTS idx_logs_user ON logs (user_email, timestamp, risk_score, session_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_logs_source_app ON logs (source_app, timestamp)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_log_categories_category ON log_categories (category, timestamp, log_id)")
+        # /api/alerts: unread filter + newest first, and the unread badge count
+        c.execute("CREATE INDEX IF NOT EXISTS idx_alerts_unread ON alerts (is_read, timestamp)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON alerts (timestamp)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_alerts_source_app ON alerts (source_app, timestamp)")
+
+    def add_response_cache_columns(self, conn):
+        # Per-app opt-in for the LLM response cache, and a flag on logs served from it.
+        conn.execute("ALTER TABLE api_keys ADD COLUMN cache_responses BOOLEAN DEFAULT 0")
+        conn.execute("ALTER TABLE logs ADD COLUMN cached BOOLEAN DEFAULT 0")
+
+    def add_log_rules_version(self, conn):
+        # Which rule snapshot (rules.RuleSnapshot.version) scored each message.
+        conn.execute("ALTER TABLE logs ADD COLUMN rules_version TEXT")
+
+    def add_change_versions(self, conn):
+        # One counter per kind of shared state; bumping it tells every worker to drop its copy.
+        conn.execute("""CREATE TABLE IF NOT EXISTS change_versions (
+            channel TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0)""")
+
+    def add_api_key_rate_limits(self, conn):
+        # Requests per minute for the key as a whole and for each user_email behind it,
+        # plus the key's burst size. NULL falls back to the defaults in ratelimit.py.
+        conn.execute("ALTER TABLE api_keys ADD COLUMN rate_limit INTEGER")
+        conn.execute("ALTER TABLE api_keys ADD COLUMN rate_burst INTEGER")
+        conn.execute("ALTER TABLE api_keys ADD COLUMN user_rate_limit INTEGER")
+
+    def add_webhook_outbox(self, conn):
+        # Alerts waiting to be POSTed to each matching webhook; written in the same
+        # transaction as the alert, drained by webhooks.WebhookDispatcher.
+        conn.execute("""CREATE TABLE IF NOT EXISTS webhook_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            webhook_id TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            created_at TEXT)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON webhook_outbox (status, next_attempt_at)")
+
+    def add_log_archives(self, conn):
+        # One row per compressed month moved out of logs/alerts by archive.Compactor.
+        conn.execute("""CREATE TABLE IF NOT EXISTS log_archives (
+            table_name TEXT,
+            month TEXT,
+            file TEXT,
+            rows INTEGER,
+            bytes INTEGER,
+            first_ts TEXT,
+            last_ts TEXT,
+            created_at TEXT,
+            PRIMARY KEY (table_name, month))""")
+
+    def add_retro_hunts(self, conn):
+        # retrohunt.RetroHunt: one row per hunt (progress + resume checkpoint), one per flagged log.
+        conn.execute("""CREATE TABLE IF NOT EXISTS retro_hunts (
+            id TEXT PRIMARY KEY,
+            rules_version TEXT,
+            status TEXT,
+            include_archives INTEGER DEFAULT 0,
+            max_rowid INTEGER,
+            last_rowid INTEGER DEFAULT 0,
+            archive_month TEXT,
+            archive_offset INTEGER DEFAULT 0,
+            scanned INTEGER DEFAULT 0,
+            hits INTEGER DEFAULT 0,
+            new_hits INTEGER DEFAULT 0,
+            total_rows INTEGER,
+            error TEXT,
+            started_at TEXT,
+            updated_at TEXT,
+            finished_at TEXT)""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS retro_hunt_hits (
+            hunt_id TEXT,
+            log_id TEXT,
+            risk_score INTEGER,
+            categories TEXT,
+            new_categories TEXT,
+            decoy TEXT,
+            detections TEXT,
+            user_email TEXT,
+            timestamp TEXT,
+            message_preview TEXT,
+            found_at TEXT,
+            PRIMARY KEY (hunt_id, log_id))""")
+
+    def add_risk_profiles(self, conn):
+        # Per-user decayed risk shared by every worker (bumped with each log batch), and the
+        # (user, session) pairs seen so far, so session counts stay exact across workers.
+        conn.execute("""CREATE TABLE IF NOT EXISTS risk_profiles (
+            user_email TEXT PRIMARY KEY,
+            score REAL NOT NULL DEFAULT 0,
+            score_at REAL NOT NULL DEFAULT 0,
+            messages INTEGER NOT NULL DEFAULT 0,
+            risk_sum INTEGER NOT NULL DEFAULT 0,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            last_seen TEXT,
+            auto_blocked INTEGER NOT NULL DEFAULT 0)""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS risk_sessions (
+            user_email TEXT,
+            session_id TEXT,
+            PRIMARY KEY (user_email, session_id)) WITHOUT ROWID""")
+        # Existing history starts with its counters and a fully decayed score
+        # (batch scans, logged as the batch@scan pseudo-user, are not anyone's activity).
+        conn.execute("""INSERT OR IGNORE INTO risk_sessions (user_email, session_id)
+                        SELECT DISTINCT user_email, session_id FROM logs
+                        WHERE user_email IS NOT NULL AND user_email != 'batch@scan'
+                              AND session_id IS NOT NULL""")
+        conn.execute("""INSERT OR IGNORE INTO risk_profiles (user_email, messages, risk_sum, sessions, last_seen)
+                        SELECT user_email, COUNT(*), COALESCE(SUM(risk_score), 0), COUNT(DISTINCT session_id),
+                               MAX(timestamp)
+                        FROM logs WHERE user_email IS NOT NULL AND user_email != 'batch@scan'
+                        GROUP BY user_email""")
 
     def seed_defaults(self, conn):
         c = conn.cursor()
@@ -96,12 +408,12 @@ class Database:
 
         # 3. Default API Key for Chatbot (Internal)
         if c.execute("SELECT count(*) FROM api_keys WHERE name='Internal Chatbot'").fetchone()[0] == 0:
-            c.execute("INSERT INTO api_keys VALUES (?, ?, ?, ?, ?, ?, ?)",
+            c.execute("INSERT INTO api_keys (id, name, key_value, source_app, is_active, usage_count, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
                       (str(uuid.uuid4()), "Internal Chatbot", "hp_live_chatbot_internal", "Chatbot", 1, 0, datetime.now().isoformat()))
         
         # 4. Default API Key for Insta Clone (External)
         if c.execute("SELECT count(*) FROM api_keys WHERE name='Insta Clone App'").fetchone()[0] == 0:
-            c.execute("INSERT INTO api_keys VALUES (?, ?, ?, ?, ?, ?, ?)",
+            c.execute("INSERT INTO api_keys (id, name, key_value, source_app, is_active, usage_count, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
                       (str(uuid.uuid4()), "Insta Clone App", "hp_live_insta_clone_123", "InstaApp", 1, 0, datetime.now().isoformat()))
 
         # 5. Honeypot: Admin Keys
@@ -117,46 +429,303 @@ class Database:
                       (str(uuid.uuid4()), "Hate Speech Filter", "hate_speech", 
                        "BLOCK_ACTION_TRIGGERED", bad_words))
 
-        conn.commit()
-
     # --- GENERIC HELPERS ---
+    # Each helper feeds honeyprompt_db_query_seconds{op=...} (count + duration).
     def query(self, sql, params=(), one=False):
-        conn = self.get_connection()
-        res = conn.execute(sql, params).fetchone() if one else conn.execute(sql, params).fetchall()
-        conn.close()
+        start = time.perf_counter()
+        with self.connection() as conn:
+            cur = conn.execute(sql, params)
+            res = cur.fetchone() if one else cur.fetchall()
+        DB_QUERIES.observe(time.perf_counter() - start, "query")
         return dict(res) if one and res else [dict(row) for row in res] if res else []
 
+    def scalar(self, sql, params=()):
+        """Returns the first column of the first row (e.g. a COUNT), or None."""
+        start = time.perf_counter()
+        with self.connection() as conn:
+            row = conn.execute(sql, params).fetchone()
+        DB_QUERIES.observe(time.perf_counter() - start, "scalar")
+        return row[0] if row else None
+
     def execute(self, sql, params=()):
+        start = time.perf_counter()
+        with self.connection() as conn:
+            conn.execute(sql, params)
+        DB_QUERIES.observe(time.perf_counter() - start, "execute")
+
+    def executemany(self, sql, seq_of_params):
+        """Runs one statement for many parameter rows in a single transaction."""
+        start = time.perf_counter()
+        with self.transaction() as conn:
+            conn.executemany(sql, seq_of_params)
+        DB_QUERIES.observe(time.perf_counter() - start, "executemany")
+
+    # --- KEYSET PAGINATION ---
+    def page_logs(self, limit=50, after=None, category=None, offset=0):
+        """
+        Returns up to `limit` logs, newest first, strictly older than the
+        (timestamp, id) key `after`. Walks idx_logs_timestamp (or the category
+        index), so page N costs the same as page 1. `offset` is only for the
+        deprecated skip-based callers and still costs O(offset).
+        """
+        params = []
+        if category:
+            sql = ("SELECT logs.* FROM log_categories JOIN logs ON logs.id = log_categories.log_id "
+                   "WHERE log_categories.category = ?")
+            params.append(category)
+            if after:
+                sql += " AND (log_categories.timestamp, log_categories.log_id) < (?, ?)"
+                params.extend(after)
+            sql += " ORDER BY log_categories.timestamp DESC, log_categories.log_id DESC LIMIT ?"
+        else:
+            sql = "SELECT * FROM logs"
+            if after:
+                sql += " WHERE (timestamp, id) < (?, ?)"
+                params.extend(after)
+            sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit)
+        if offset:
+            sql += " OFFSET ?"
+            params.append(offset)
+        return self.query(sql, params)
+
+    def iter_logs(self, category=None, chunk_size=1000):
+        """Yields every log, newest first, one keyset page at a time (never the whole table)."""
+        after = None
+        while True:
+            rows = self.page_logs(chunk_size, after, category)
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            after = (rows[-1]["timestamp"], rows[-1]["id"])
+
+    def count_logs(self, category=None):
+        """Live log count: rollups (O(days)) from the first live month on, or the category index when filtered."""
+        if category:
+            return self.scalar("SELECT COUNT(*) FROM log_categories WHERE category = ?", (category,))
+        # archive.Compactor moves whole months out, so earlier rollup days belong to archived rows.
+        return self.scalar("SELECT COALESCE(SUM(total), 0) FROM daily_stats "
+                           "WHERE day >= (SELECT substr(MIN(timestamp), 1, 7) FROM logs)")
+
+    # --- BULK INSERTS ---
+    def insert_logs(self, records, track_risk=True):
+        """
+        Inserts log records (dicts keyed by LOG_COLUMNS) and bumps the rollups, in one transaction.
+        track_risk=False keeps them out of the per-user risk profiles (e.g. batch scans of documents).
+        """
+        with self.transaction():
+            self._insert_many("logs", LOG_COLUMNS, records)
+            self._insert_categories(records)
+            self._update_rollups(records)
+            if track_risk:
+                self._update_risk_profiles(records)
+
+    def insert_alerts(self, records):
+        """Inserts alert records (dicts keyed by ALERT_COLUMNS) and their webhook deliveries, in one transaction."""
+        if not records:
+            return
+        with self.transaction():
+            self._insert_many("alerts", ALERT_COLUMNS, records)
+            self._enqueue_webhooks(records)
+
+    def _enqueue_webhooks(self, records):
+        """Queues each alert for every active webhook whose min_risk_score it reaches."""
+        hooks = self.query("SELECT id, min_risk_score FROM webhooks WHERE is_active = 1")
+        if not hooks:
+            return
+        now, created = time.time(), datetime.now().isoformat()
+        rows = []
+        for r in records:
+            payload = {col: r.get(col) for col in ALERT_COLUMNS if col != "is_read"}
+            try:
+                payload["categories"] = json.loads(payload["categories"] or "[]")
+            except (TypeError, ValueError):
+                pass
+            encoded = json.dumps(payload)
+            rows.extend((h["id"], encoded, now, created) for h in hooks
+                        if (r.get("risk_score") or 0) >= (h["min_risk_score"] or 0))
+        if rows:
+            self.get_connection().executemany(
+                "INSERT INTO webhook_outbox (webhook_id, payload, next_attempt_at, created_at) VALUES (?, ?, ?, ?)", rows)
+
+    def _insert_many(self, table, columns, records):
+        if not records:
+            return
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        self.executemany(sql, [tuple(r.get(col) for col in columns) for r in records])
+
+    def _insert_categories(self, records):
+        rows = []
+        for r in records:
+            try:
+                rows.extend((r["id"], cat, r.get("timestamp")) for cat in json.loads(r.get("threat_categories") or "[]"))
+            except (TypeError, ValueError):
+                pass
+        if rows:
+            self.get_connection().executemany(
+                "INSERT OR IGNORE INTO log_categories (log_id, category, timestamp) VALUES (?, ?, ?)", rows)
+
+    # --- DASHBOARD ROLLUPS ---
+    def _update_rollups(self, records):
+        daily, categories = {}, {}
+        for r in records:
+            if not r.get("timestamp"):
+                continue
+            key = (r["timestamp"].split("T")[0], r.get("source_app") or "Chatbot")
+            total, high = daily.get(key, (0, 0))
+            daily[key] = (total + 1, high + ((r.get("risk_score") or 0) > 70))
+            try:
+                for cat in json.loads(r.get("threat_categories") or "[]"):
+                    categories[cat] = categories.get(cat, 0) + 1
+            except (TypeError, ValueError):
+                pass
+
+        conn = self.get_connection()
+        conn.executemany(
+            """INSERT INTO daily_stats (day, source_app, total, high_risk) VALUES (?, ?, ?, ?)
+               ON CONFLICT(day, source_app) DO UPDATE SET
+                   total = total + excluded.total, high_risk = high_risk + excluded.high_risk""",
+            [(day, app, total, high) for (day, app), (total, high) in daily.items()])
+        conn.executemany(
+            """INSERT INTO category_stats (category, count) VALUES (?, ?)
+               ON CONFLICT(category) DO UPDATE SET count = count + excluded.count""",
+            list(categories.items()))
+
+    def _update_risk_profiles(self, records):
+        """
+        Folds a batch of logs into the shared per-user risk: counters plus a score
+        that decays with HALF_LIFE (stored as of score_at, on the log timestamps).
+        Runs inside the flush transaction, so concurrent workers serialize on it;
+        a user crossing AUTO_BLOCK_SCORE is blocked once, by whichever flush tips it.
+        """
+        by_user = {}
+        for r in records:
+            if r.get("user_email"):
+                by_user.setdefault(r["user_email"], []).append(r)
+        if not by_user:
+            return
         conn = self.get_connection()
-        conn.execute(sql, params)
-        conn.commit()
-        conn.close()
+        emails = list(by_user)
+        current = {row["user_email"]: row for row in self.query(
+            f"SELECT * FROM risk_profiles WHERE user_email IN ({', '.join('?' * len(emails))})", emails)}
+
+        pairs = {(r["user_email"], r["session_id"]) for r in records if r.get("user_email") and r.get("session_id")}
+        new_sessions = {}
+        if pairs:
+            known = {(row["user_email"], row["session_id"]) for row in self.query(
+                "SELECT user_email, session_id FROM risk_sessions WHERE (user_email, session_id) IN "
+                f"(VALUES {', '.join(['(?, ?)'] * len(pairs))})", [v for pair in pairs for v in pair])}
+            if pairs - known:
+                conn.executemany("INSERT INTO risk_sessions (user_email, session_id) VALUES (?, ?)", pairs - known)
+            for email, _ in pairs - known:
+                new_sessions[email] = new_sessions.get(email, 0) + 1
+
+        rows, to_block = [], []
+        for email, logs in by_user.items():
+            p = current.get(email) or {"score": 0.0, "score_at": 0.0, "messages": 0, "risk_sum": 0,
+                                       "sessions": 0, "last_seen": None, "auto_blocked": 0}
+            score, score_at, last_seen = p["score"], p["score_at"], p["last_seen"]
+            for r in sorted(logs, key=lambda r: r.get("timestamp") or ""):
+                at = _epoch(r.get("timestamp"))
+                score = decay(score, score_at, at) + (r.get("risk_score") or 0)
+                score_at = max(score_at, at)
+                last_seen = max(last_seen or "", r.get("timestamp") or "") or None
+            block = score >= AUTO_BLOCK_SCORE and not p["auto_blocked"]
+            if block:
+                to_block.append(email)
+            rows.append((email, score, score_at, p["messages"] + len(logs),
+                         p["risk_sum"] + sum(r.get("risk_score") or 0 for r in logs),
+                         p["sessions"] + new_sessions.get(email, 0), last_seen, int(p["auto_blocked"] or block)))
+        conn.executemany(
+            """INSERT INTO risk_profiles (user_email, score, score_at, messages, risk_sum, sessions, last_seen,
+                                          auto_blocked) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(user_email) DO UPDATE SET
+                   score = excluded.score, score_at = excluded.score_at, messages = excluded.messages,
+                   risk_sum = excluded.risk_sum, sessions = excluded.sessions, last_seen = excluded.last_seen,
+                   auto_blocked = excluded.auto_blocked""", rows)
+        for email in to_block:
+            self.block_user(email, "Auto-blocked: sustained high-risk activity")
+
+    def backfill_stats(self):
+        """Rebuilds the rollup tables from the live logs table (archive.Compactor.backfill_rollups adds the rest)."""
+        with self.transaction() as conn:
+            self._rebuild_rollups(conn)
+        return self.scalar("SELECT COALESCE(SUM(total), 0) FROM daily_stats")
+
+    def _rebuild_rollups(self, conn):
+        conn.execute("DELETE FROM daily_stats")
+        conn.execute("DELETE FROM category_stats")
+        conn.execute("""
+            INSERT INTO daily_stats (day, source_app, total, high_risk)
+            SELECT substr(timestamp, 1, 10), COALESCE(source_app, 'Chatbot'),
+                   COUNT(*), SUM(risk_score > 70)
+            FROM logs WHERE timestamp IS NOT NULL GROUP BY 1, 2
+        """)
+        conn.execute("""
+            INSERT INTO category_stats (category, count)
+            SELECT j.value, COUNT(*)
+            FROM logs, json_each(logs.threat_categories) AS j
+            WHERE json_valid(logs.threat_categories) AND json_type(logs.threat_categories) = 'array'
+            GROUP BY j.value
+        """)
+
+    # --- API KEYS ---
+    def resolve_api_key(self, key_value):
+        """
+        Returns {id, source_app, cache_responses, rate_limit, rate_burst, user_rate_limit}
+        for an API key value, or None. Cached (misses included).
+        """
+        return self.api_key_cache.get_or_load(key_value, lambda: self.query(
+            "SELECT id, source_app, cache_responses, rate_limit, rate_burst, user_rate_limit "
+            "FROM api_keys WHERE key_value = ?", (key_value,), one=True) or None)
 
     # --- BLOCKING HELPER ---
     def block_user(self, email, reason):
         """Blocks a user and records the reason."""
-        self.execute("UPDATE users SET is_blocked = 1, blocked_reason = ? WHERE email = ?", (reason, email))
+        with self.transaction() as conn:
+            conn.execute("UPDATE users SET is_blocked = 1, blocked_reason = ? WHERE email = ?", (reason, email))
+            self.notify_change("blocks")
+        self.block_cache.invalidate(email)
 
     def is_user_blocked(self, email):
-        """Checks if a user is blocked."""
+        """Checks if a user is blocked. Cached; block_user() invalidates the entry."""
+        return self.block_cache.get_or_load(email, lambda: self._load_block_status(email))
+
+    def _load_block_status(self, email):
         res = self.query("SELECT is_blocked, blocked_reason FROM users WHERE email = ?", (email,), one=True)
         if res and res['is_blocked']:
             return True, res['blocked_reason']
         return False, None
 
-    # --- DASHBOARD STATS ---
-# ... inside class Database ...
+    # --- CROSS-PROCESS INVALIDATION ---
+    def notify_change(self, channel):
+        """Bumps a channel's counter; other workers see it on their next poll (see invalidation.py)."""
+        self.execute("INSERT INTO change_versions (channel, version) VALUES (?, 1) "
+                     "ON CONFLICT(channel) DO UPDATE SET version = version + 1", (channel,))
+
+    def change_versions(self):
+        return {r["channel"]: r["version"] for r in self.query("SELECT channel, version FROM change_versions")}
+
+    # --- THREAT PROFILES ---
+    def get_risk_profiles(self):
+        """Per-user counters and the shared risk score decayed to now, highest average risk first (no log scan)."""
+        now = time.time()
+        profiles = self.query("SELECT *, CASE WHEN messages THEN CAST(risk_sum AS REAL) / messages ELSE 0 END "
+                              "AS avg_risk FROM risk_profiles ORDER BY avg_risk DESC")
+        for p in profiles:
+            p["risk_score"] = round(decay(p["score"], p["score_at"], now), 1)
+        return profiles
+
 
     # --- DASHBOARD STATS ---
     def get_dashboard_stats(self):
-        conn = self.get_connection()
-        c = conn.cursor()
-        
+        """Reads the rollup tables only: O(days + categories) rows, whatever the size of logs."""
         # 1. Basic Counts
-        total = c.execute("SELECT COUNT(*) FROM logs").fetchone()[0]
-        high_risk = c.execute("SELECT COUNT(*) FROM logs WHERE risk_score > 70").fetchone()[0]
-        active_decoys = c.execute("SELECT COUNT(*) FROM decoys WHERE is_active = 1").fetchone()[0]
-        blocked_users = c.execute("SELECT COUNT(*) FROM users WHERE is_blocked = 1").fetchone()[0]
+        totals = self.query("SELECT COALESCE(SUM(total), 0) AS total, COALESCE(SUM(high_risk), 0) AS high_risk "
+                            "FROM daily_stats", one=True)
+        total, high_risk = totals["total"], totals["high_risk"]
+        active_decoys = self.scalar("SELECT COUNT(*) FROM decoys WHERE is_active = 1")
+        blocked_users = self.scalar("SELECT COUNT(*) FROM users WHERE is_blocked = 1")
         
         # 2. REAL Trend Logic (Count per day)
         trend_map = {}
@@ -165,36 +734,17 @@ class Database:
             date_label = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
             trend_map[date_label] = 0
 
-        # Fetch all timestamps and count them
-        all_logs = c.execute("SELECT timestamp FROM logs").fetchall()
-        for row in all_logs:
-            # Timestamp format is ISO (YYYY-MM-DDTHH:MM:SS...)
-            # We split by 'T' to get just the date part
-            try:
-                date_part = row[0].split("T")[0]
-                if date_part in trend_map:
-                    trend_map[date_part] += 1
-            except:
-                continue
+        first_day = next(iter(trend_map))
+        for row in self.query("SELECT day, SUM(total) AS n FROM daily_stats WHERE day >= ? GROUP BY day", (first_day,)):
+            if row["day"] in trend_map:
+                trend_map[row["day"]] = row["n"]
 
         # Convert to list for frontend
         trend = [{"date": k, "attacks": v} for k, v in trend_map.items()]
 
         # 3. Category Breakdown
-        # We need to parse the JSON list in 'threat_categories'
-        cat_map = {}
-        cat_logs = c.execute("SELECT threat_categories FROM logs").fetchall()
-        for row in cat_logs:
-            try:
-                cats = json.loads(row[0])
-                for cat in cats:
-                    cat_map[cat] = cat_map.get(cat, 0) + 1
-            except:
-                pass
-        
-        category_breakdown = [{"category": k, "count": v} for k, v in cat_map.items()]
-
-        conn.close()
+        category_breakdown = [{"category": r["category"], "count": r["count"]}
+                              for r in self.query("SELECT category, count FROM category_stats")]
         
         return {
             "total_attacks": total,
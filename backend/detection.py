@@ -1,4 +1,7 @@
 import re
+from collections import namedtuple
+from matcher import LiteralScanner
+from normalize import normalize, fold_pattern
 
 # --- THREAT PATTERNS ---
 # We define specific patterns to catch based on your "Honeypot" design.
@@ -25,29 +28,142 @@ PATTERNS = {
     }
 }
 
+# One category hit: the pattern that fired and where it matched in the text.
+Detection = namedtuple("Detection", ["category", "pattern", "span", "risk"])
+
+# Escapes that stand for a single literal character rather than a class.
+_CLASS_ESCAPES = set("sSdDwWbBAZ")
+_QUANTIFIERS = set("*+?{")
+
+
+def required_literal(pattern: str):
+    """
+    Returns the longest run of plain characters every match of `pattern` must
+    contain (lowercased), or None if the pattern is too dynamic to anchor on.
+    Deliberately conservative: alternations and groups are never anchored.
+    """
+    runs, run, i = [], "", 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch in "|(":
+            return None
+        if ch == "\\" and i + 1 < len(pattern):
+            nxt = pattern[i + 1]
+            if nxt in _CLASS_ESCAPES or nxt.isalnum():
+                runs.append(run)
+                run = ""
+            else:
+                run += nxt
+            i += 2
+        elif ch == "[":
+            runs.append(run)
+            run = ""
+            i = pattern.find("]", i + 2) + 1 or len(pattern)
+        elif ch in _QUANTIFIERS:
+            # The quantified character may be absent (or repeated): drop it from the run.
+            runs.append(run[:-1])
+            run = ""
+            if ch == "{":
+                i = pattern.find("}", i) + 1 or len(pattern)
+            else:
+                i += 1
+        elif ch in ".^$)":
+            runs.append(run)
+            run = ""
+            i += 1
+        else:
+            run += ch
+            i += 1
+    runs.append(run)
+    best = max(runs, key=len)
+    return best.lower() if best.strip() else None
+
+
+class DetectionEngine:
+    """
+    Precompiles every category pattern and indexes each one by a literal it
+    cannot match without. A single trie pass over the prompt finds which
+    literals occur, and only those rules (plus any un-anchorable ones) run
+    their full regex, so cost tracks the prompt, not the rule count.
+
+    This stands in for one combined (?P<rule>...)|... alternation on purpose.
+    CPython's backtracking engine tries every branch at every offset and
+    saves/restores each group's marks as it goes, which benchmarks/bench_detection.py
+    shows is slower than the old per-pattern loop at every rule count. A
+    single alternation also reports only one of several overlapping matches,
+    so a category could go undetected.
+    """
+
+    def __init__(self, patterns=None):
+        self.patterns = PATTERNS if patterns is None else patterns
+        self._rules = []        # (category, pattern, compiled)
+        self._by_literal = {}   # literal -> rule ids anchored on it
+        self._always = set()    # rule ids with no usable literal
+
+        for category, data in self.patterns.items():
+            for pattern in data["patterns"]:
+                rule_id = len(self._rules)
+                # Scanned text is normalized, so the pattern's literals are folded the same way.
+                folded = fold_pattern(pattern)
+                self._rules.append((category, pattern, re.compile(folded, re.IGNORECASE)))
+                literal = required_literal(folded)
+                if literal:
+                    self._by_literal.setdefault(literal, []).append(rule_id)
+                else:
+                    self._always.add(rule_id)
+
+        self._literals = LiteralScanner(self._by_literal)
+
+    def scan(self, text: str):
+        """Returns the first Detection for every category that matches, in PATTERNS order."""
+        if not text:
+            return []
+
+        candidates = set(self._always)
+        for literal, _ in self._literals.finditer(text.lower()):
+            candidates.update(self._by_literal[literal])
+
+        detections, done = [], set()
+        for rule_id in sorted(candidates):
+            category, pattern, compiled = self._rules[rule_id]
+            if category in done:
+                continue
+            m = compiled.search(text)
+            if m:
+                done.add(category)
+                detections.append(Detection(category, pattern, m.span(), self.patterns[category]["risk"]))
+        return detections
+
+    def analyze(self, text: str):
+        detections = self.scan(text)
+        return {
+            "is_threat": len(detections) > 0,
+            "risk_score": max((d.risk for d in detections), default=0),
+            "categories": [d.category for d in detections],
+            "spans": {d.category: list(d.span) for d in detections},
+            "timestamp": "now" # Placeholder for logging later
+        }
+
+    def analyze_many(self, texts):
+        """Batch form of analyze() for offline rescoring (e.g. of the logs table)."""
+        return [self.analyze(text) for text in texts]
+
+
+engine = DetectionEngine()
+
+
 def analyze_prompt(text: str):
     """
     Scans the user input against defined threat patterns.
     Returns a dictionary containing threat status, risk score, and metadata.
+    Spans refer to the normalized text.
+    """
+    return engine.analyze(normalize(text))
+
+
+def analyze_many(texts):
+    """
+    Scans a batch of texts with the shared engine.
+    Returns one analyze_prompt() result per text, in order.
     """
-    text_lower = text.lower()
-    detected_threats = []
-    max_risk = 0
-
-    # Iterate through all threat categories
-    for category, data in PATTERNS.items():
-        for pattern in data["patterns"]:
-            # Check if the pattern exists in the text
-            if re.search(pattern, text_lower):
-                detected_threats.append(category)
-                max_risk = max(max_risk, data["risk"])
-                break  # Stop checking this category if one pattern is found
-
-    is_threat = len(detected_threats) > 0
-
-    return {
-        "is_threat": is_threat,
-        "risk_score": max_risk,
-        "categories": detected_threats,
-        "timestamp": "now" # Placeholder for logging later
-    }
\ No newline at end of file
+    return engine.analyze_many([normalize(t) for t in texts])
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+
+# --- LIVE FEED CONFIGURATION ---
+# Dashboards load one snapshot (/api/dashboard/stats, /api/alerts) and then
+# follow /api/events instead of polling.
+FEED_CLIENT_BUFFER = int(os.environ.get("FEED_CLIENT_BUFFER", "256"))     # queued events per client before it is dropped
+FEED_MAX_CLIENTS = int(os.environ.get("FEED_MAX_CLIENTS", "1000"))        # concurrent streams per worker
+FEED_FLUSH_INTERVAL = float(os.environ.get("FEED_FLUSH_INTERVAL", "0.5"))  # seconds between counter-delta events
+FEED_KEEPALIVE = float(os.environ.get("FEED_KEEPALIVE", "15"))           # seconds of silence before a ping comment
+TAIL_CHUNK = 1000
+HIGH_RISK = 70  # same cut as Database._update_rollups
+
+
+class Subscriber:
+    """One connected client: a bounded queue, closed when the client falls too far behind."""
+
+    def __init__(self, maxsize):
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = False
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class LiveFeed:
+    """
+    In-process pub/sub hub for the dashboard. chat_proxy publishes each alert
+    as it is queued, and each log as a counter delta; deltas are summed and
+    sent as one "stats" event per FEED_FLUSH_INTERVAL. Every subscriber has a
+    bounded buffer: publishing never waits, and a client whose buffer fills
+    up is dropped (it reconnects and reloads the snapshot).
+
+    With several worker processes, rows written by the other workers are
+    picked up by tailing logs/alerts by rowid while anyone is subscribed;
+    rows this worker already published are skipped.
+    """
+
+    def __init__(self, database, buffer=FEED_CLIENT_BUFFER, max_clients=FEED_MAX_CLIENTS,
+                 flush_interval=FEED_FLUSH_INTERVAL):
+        self.db = database
+        self.buffer = buffer
+        self.max_clients = max_clients
+        self.flush_interval = flush_interval
+        self._subscribers = set()
+        self._delta = None
+        self._local = set()  # ids published here, skipped when the tail reaches them
+        self._cursor = None  # (logs rowid, alerts rowid) the tail has read up to
+        self._task = None
+        self.published = 0
+        self.dropped = 0
+
+    # --- SUBSCRIPTIONS ---
+    def subscribe(self):
+        """Returns a Subscriber, or None when the worker already serves max_clients streams."""
+        if len(self._subscribers) >= self.max_clients:
+            return None
+        sub = Subscriber(self.buffer)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        self._subscribers.discard(sub)
+        if not self._subscribers:
+            self._local.clear()
+            self._cursor = None  # the next subscriber starts from a fresh snapshot
+
+    async def stream(self, sub):
+        """Yields SSE frames for one subscriber until it disconnects or is dropped."""
+        try:
+            yield format_sse("ready", {"time": datetime.now().isoformat()})
+            while True:
+                try:
+                    frame = await asyncio.wait_for(sub.queue.get(), FEED_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if frame is None:
+                    yield format_sse("dropped", {"reason": "slow consumer"})
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(sub)
+
+    def publish(self, event, data):
+        """Fans one event out to every subscriber without waiting on any of them."""
+        if not self._subscribers:
+            return
+        frame = format_sse(event, data)
+        for sub in list(self._subscribers):
+            try:
+                sub.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._drop(sub)
+        self.published += 1
+
+    def _drop(self, sub):
+        self._subscribers.discard(sub)
+        sub.dropped = True
+        self.dropped += 1
+        # Make room for the sentinel so the stream ends now rather than after the backlog.
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(None)
+
+    # --- PUBLISHERS (event loop) ---
+    def alert(self, record):
+        """Publishes a newly queued alert row."""
+        if not self._subscribers:
+            return
+        self._local.add(record["id"])
+        self._publish_alert(record)
+
+    def logged(self, record):
+        """Adds one queued log row to the pending counter delta."""
+        if not self._subscribers:
+            return
+        self._local.add(record["id"])
+        self._add_delta(record)
+
+    def _publish_alert(self, record):
+        alert = dict(record)
+        try:
+            alert["categories"] = json.loads(alert.get("categories") or "[]")
+        except (TypeError, ValueError):
+            alert["categories"] = []
+        self.publish("alert", alert)
+
+    def _add_delta(self, record):
+        if self._delta is None:
+            self._delta = {"total_attacks": 0, "high_risk_attacks": 0, "categories": {}, "days": {}}
+        d = self._delta
+        d["total_attacks"] += 1
+        d["high_risk_attacks"] += (record.get("risk_score") or 0) > HIGH_RISK
+        day = (record.get("timestamp") or "").split("T")[0]
+        if day:
+            d["days"][day] = d["days"].get(day, 0) + 1
+        try:
+            for cat in json.loads(record.get("threat_categories") or "[]"):
+                d["categories"][cat] = d["categories"].get(cat, 0) + 1
+        except (TypeError, ValueError):
+            pass
+
+    # --- BACKGROUND FLUSH + CROSS-WORKER TAIL ---
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for sub in list(self._subscribers):
+            self._drop(sub)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if not self._subscribers:
+                continue
+            try:
+                await self._tail()
+            except Exception as e:
+                print(f"❌ Live feed tail failed: {e}")
+            if self._delta:
+                delta, self._delta = self._delta, None
+                self.publish("stats", delta)
+
+    async def _tail(self):
+        if self._cursor is None:
+            self._cursor = await asyncio.to_thread(self._max_rowids)
+            return
+        logs, alerts, self._cursor = await asyncio.to_thread(self._read_since, *self._cursor)
+        for row in logs:
+            if row["id"] in self._local:
+                self._local.discard(row["id"])
+            else:
+                self._add_delta(row)
+        for row in alerts:
+            if row["id"] in self._local:
+                self._local.discard(row["id"])
+            else:
+                self._publish_alert(row)
+
+    def _max_rowids(self):
+        return (self.db.scalar("SELECT COALESCE(MAX(rowid), 0) FROM logs"),
+                self.db.scalar("SELECT COALESCE(MAX(rowid), 0) FROM alerts"))
+
+    def _read_since(self, log_rowid, alert_rowid):
+        logs = self.db.query("SELECT rowid, id, risk_score, threat_categories, timestamp FROM logs "
+                             "WHERE rowid > ? ORDER BY rowid LIMIT ?", (log_rowid, TAIL_CHUNK))
+        alerts = self.db.query("SELECT rowid, * FROM alerts WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                               (alert_rowid, TAIL_CHUNK))
+        cursor = (logs[-1]["rowid"] if logs else log_rowid, alerts[-1]["rowid"] if alerts else alert_rowid)
+        for a in alerts:
+            del a["rowid"]
+        return logs, alerts, cursor
+
+    def stats(self):
+        return {"subscribers": len(self._subscribers), "published": self.published, "dropped": self.dropped}
@@ -0,0 +1,60 @@
+import asyncio
+import inspect
+import os
+
+# --- CROSS-PROCESS INVALIDATION ---
+# Each worker polls the change_versions table; a change made by any worker
+# reaches the others within one interval.
+INVALIDATION_POLL_INTERVAL = float(os.environ.get("INVALIDATION_POLL_INTERVAL", "0.5"))  # seconds
+
+
+class ChangeWatcher:
+    """
+    Polls the per-channel counters that Database.notify_change() bumps and
+    runs the callbacks registered for every channel whose counter moved.
+    One indexed read of a tiny table per interval, whatever the traffic.
+    """
+
+    def __init__(self, database, interval=INVALIDATION_POLL_INTERVAL):
+        self.db = database
+        self.interval = interval
+        self._handlers = {}   # channel -> [callback, ...]
+        self._seen = None
+        self._task = None
+
+    def on(self, channel, callback):
+        """callback() runs on the event loop; it may return an awaitable (e.g. asyncio.to_thread(...))."""
+        self._handlers.setdefault(channel, []).append(callback)
+
+    async def start(self):
+        if self._task is None:
+            self._seen = await asyncio.to_thread(self.db.change_versions)  # baseline: nothing to replay
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"❌ Invalidation poll failed: {e}")
+
+    async def poll(self):
+        versions = await asyncio.to_thread(self.db.change_versions)
+        changed = [channel for channel, version in versions.items() if self._seen.get(channel) != version]
+        self._seen = versions
+        for channel in changed:
+            for callback in self._handlers.get(channel, ()):
+                result = callback()
+                if inspect.isawaitable(result):
+                    await result
+        return changed
@@ -1,12 +1,273 @@
+import atexit
+import gzip
 import json
 import os
+import shutil
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
 
-LOG_FILE = "attacks.json"
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process index lock
+    fcntl = None
+
+# --- FILE LOG CONFIGURATION ---
+LOG_DIR = os.environ.get("ATTACK_LOG_DIR", "attack_logs")
+LOG_FILE = "attacks.json"  # legacy single-file log; see import_legacy_file()
+INDEX_FILE = "index.json"
+INDEX_LOCK_FILE = "index.lock"
+
+MAX_SEGMENT_BYTES = 64 * 1024 * 1024  # rotate once the active segment reaches this size...
+MAX_SEGMENT_AGE = 24 * 60 * 60        # ...or this many seconds after it was opened
+FSYNC_EVERY = 64                      # fsync after this many entries...
+FSYNC_INTERVAL = 1.0                  # ...or this many seconds, whichever comes first
+
+
+class NDJSONSink:
+    """
+    Append-only attack log: one JSON object per line in time-ordered segment
+    files. Each entry is a single O_APPEND write, so concurrent writers never
+    interleave partial lines, and nothing already written is read back.
+    Closed segments are listed in index.json with their time range (and
+    optionally gzipped) so readers can skip straight to the ones they need.
+    """
+
+    def __init__(self, directory=LOG_DIR, max_bytes=MAX_SEGMENT_BYTES, max_age=MAX_SEGMENT_AGE,
+                 compress=True, fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._fd = None
+        self._path = None
+        self._opened_at = 0.0
+        self._size = 0
+        self._first_ts = None
+        self._last_ts = None
+        self._count = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    # --- WRITING ---
+    def write(self, entry):
+        line = (json.dumps(entry, default=str) + "\n").encode()
+        with self._lock:
+            if self._fd is None:
+                self._open_segment()
+            elif self._size >= self.max_bytes or time.monotonic() - self._opened_at >= self.max_age:
+                self._rotate()
+            os.write(self._fd, line)
+            self._size += len(line)
+            self._count += 1
+            ts = entry.get("timestamp")
+            if ts:  # concurrent writers may append slightly out of order: track min/max
+                self._first_ts = ts if self._first_ts is None else min(self._first_ts, ts)
+                self._last_ts = ts if self._last_ts is None else max(self._last_ts, ts)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def flush(self):
+        with self._lock:
+            if self._fd is not None:
+                self._sync()
+
+    def close(self):
+        """Syncs and closes the active segment and records it in the index."""
+        with self._lock:
+            if self._fd is not None:
+                self._close_segment(compress=False)
+
+    def _sync(self):
+        os.fsync(self._fd)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        self._path = os.path.join(self.directory, f"attacks-{stamp}.ndjson")
+        self._fd = os.open(self._path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._opened_at = time.monotonic()
+        self._size = os.fstat(self._fd).st_size
+        self._first_ts = self._last_ts = None
+        self._count = 0
+
+    def _close_segment(self, compress):
+        self._sync()
+        os.close(self._fd)
+        path, self._fd = self._path, None
+        if self._count:
+            entry = {"file": os.path.basename(path), "first": self._first_ts, "last": self._last_ts,
+                     "count": self._count}
+            if compress:
+                # Compress off the write path; readers handle either name until it is swapped.
+                threading.Thread(target=self._compress_segment, args=(path, entry), daemon=True).start()
+            _update_index(self.directory, entry)
+        elif os.path.getsize(path) == 0:
+            os.remove(path)
+
+    def _rotate(self):
+        self._close_segment(compress=self.compress)
+        self._open_segment()
+
+    def _compress_segment(self, path, entry):
+        with open(path, "rb") as src, gzip.open(path + ".gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(path + ".gz.tmp", path + ".gz")
+        with self._lock:
+            _update_index(self.directory, dict(entry, file=entry["file"] + ".gz"), replace=entry["file"])
+        os.remove(path)
+
+
+# --- SEGMENT INDEX ---
+def _index_path(directory):
+    return os.path.join(directory, INDEX_FILE)
+
+
+def read_index(directory=LOG_DIR):
+    """Closed segments in time order: [{file, first, last, count}, ...]."""
+    try:
+        with open(_index_path(directory)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+
+@contextmanager
+def _index_lock(directory):
+    """Serializes index updates across worker processes (no-op where flock is unavailable)."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, INDEX_LOCK_FILE), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _update_index(directory, entry, replace=None):
+    # Read-modify-write under the lock, or two workers rotating at once drop each other's entries.
+    with _index_lock(directory):
+        index = [e for e in read_index(directory) if e["file"] not in (entry["file"], replace)]
+        index.append(entry)
+        index.sort(key=lambda e: (e["first"] or "", e["file"]))
+        tmp = _index_path(directory) + f".{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, _index_path(directory))
+
+
+# --- READING ---
+def _segments(directory, start=None, end=None):
+    """Segment paths overlapping [start, end], oldest first; the active segment is always included."""
+    if not os.path.isdir(directory):
+        return []
+    index = read_index(directory)
+    indexed = {e["file"] for e in index}
+    paths = [os.path.join(directory, e["file"]) for e in index
+             if not (start and e["last"] and e["last"] < start) and not (end and e["first"] and e["first"] > end)]
+    names = os.listdir(directory)
+    for name in sorted(names):
+        if not name.startswith("attacks-") or name in indexed:
+            continue
+        # Not indexed yet: the active segment (or one mid-compression)
+        if name.endswith(".ndjson") and name + ".gz" not in indexed:
+            paths.append(os.path.join(directory, name))
+        # A compressed segment missing from the index (e.g. an entry lost to an older, unlocked update)
+        elif name.endswith(".ndjson.gz") and name[:-3] not in indexed and name[:-3] not in names:
+            paths.append(os.path.join(directory, name))
+    return paths
+
+
+def _read_segment(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    try:
+        with opener(path, "rt") as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn final line after a crash
+    except FileNotFoundError:
+        # Swapped for its .gz while we were listing; read that instead.
+        if not path.endswith(".gz") and os.path.exists(path + ".gz"):
+            yield from _read_segment(path + ".gz")
+
+
+def iter_entries(start=None, end=None, directory=LOG_DIR):
+    """Lazily yields entries with start <= timestamp <= end (ISO strings), oldest first."""
+    for path in _segments(directory, start, end):
+        for entry in _read_segment(path):
+            ts = entry.get("timestamp") or ""
+            if (start and ts < start) or (end and ts > end):
+                continue
+            yield entry
+
+
+def tail(n=100, directory=LOG_DIR):
+    """Returns the newest n entries, reading segments newest-first only until it has enough."""
+    found = deque()
+    for path in reversed(_segments(directory)):
+        chunk = deque(_read_segment(path), maxlen=n - len(found))
+        found.extendleft(reversed(chunk))
+        if len(found) >= n:
+            break
+    return list(found)
+
+
+def follow(directory=LOG_DIR, poll=0.5):
+    """Yields new entries as they are appended (like tail -f), following rotations."""
+    seen = {}  # path -> byte offset already read
+    for path in _segments(directory):
+        if path.endswith(".ndjson"):
+            seen[path] = os.path.getsize(path)
+    while True:
+        progressed = False
+        for path in _segments(directory):
+            if not path.endswith(".ndjson") or not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                f.seek(seen.get(path, 0))
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break  # partial line; pick it up on the next poll
+                    seen[path] = f.tell()
+                    progressed = True
+                    try:
+                        yield json.loads(raw)
+                    except json.JSONDecodeError:
+                        continue
+        if not progressed:
+            time.sleep(poll)
+
+
+# --- PUBLIC API (unchanged call signatures) ---
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_sink():
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = NDJSONSink()
+            atexit.register(_sink.close)
+        return _sink
+
 
 def log_threat(user_message, analysis, ai_response):
     """
-    Logs a detected threat to a JSON file.
+    Appends a detected threat to the NDJSON attack log.
     """
     # 1. Create the log entry structure
     log_entry = {
@@ -18,33 +279,34 @@ def log_threat(user_message, analysis, ai_response):
         "session_id": "default-session" # Placeholder for future expansion
     }
 
-    # 2. Read existing logs (if file exists)
-    logs = []
-    if os.path.exists(LOG_FILE):
-        try:
-            with open(LOG_FILE, "r") as f:
-                logs = json.load(f)
-        except json.JSONDecodeError:
-            logs = [] # Start fresh if file is corrupted
-
-    # 3. Append new log
-    logs.append(log_entry)
+    # 2. Append (no read-modify-write of the history)
+    get_sink().write(log_entry)
 
-    # 4. Write back to file
-    with open(LOG_FILE, "w") as f:
-        json.dump(logs, f, indent=4)
+    print(f"📁 [LOGGING]: Attack saved to {LOG_DIR}")
 
-    print(f"📁 [LOGGING]: Attack saved to {LOG_FILE}")
 
-def get_logs():
+def get_logs(start=None, end=None, limit=None):
     """
-    Retrieves all logs for the dashboard.
+    Retrieves logs for the dashboard, optionally limited to a time range
+    and/or the newest `limit` entries.
     """
-    if not os.path.exists(LOG_FILE):
-        return []
-    
-    with open(LOG_FILE, "r") as f:
+    if limit and not start and not end:
+        return tail(limit)
+    entries = iter_entries(start, end)
+    return list(deque(entries, maxlen=limit)) if limit else list(entries)
+
+
+def import_legacy_file(path=LOG_FILE):
+    """One-off: appends the entries of the old attacks.json array to the NDJSON log."""
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
         try:
-            return json.load(f)
-        except:
-            return []
\ No newline at end of file
+            entries = json.load(f)
+        except json.JSONDecodeError:
+            return 0
+    sink = get_sink()
+    for entry in entries:
+        sink.write(entry)
+    sink.flush()
+    return len(entries)
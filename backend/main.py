@@ -1,28 +1,96 @@
-import uvicorn
+import asyncio
 import uuid
 import json
 import os
+import csv
+import io
+import math
+import base64
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from fastapi import FastAPI, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional, List
-from database import db
-from groq import Groq  # <--- NEW IMPORT
+from database import db, LOG_COLUMNS
+from writer import log_writer
+from cache import TTLCache, UsageCounter
+from providers import get_provider, ProviderError, ProviderTimeout
+from response_cache import ResponseCache, cache_key
+from session import RiskTracker
+from rules import RuleRegistry
+from invalidation import ChangeWatcher
+from ratelimit import RateLimiter, DEFAULT_KEY_RATE, DEFAULT_USER_RATE, ANONYMOUS_RATE, retry_after_header
+from normalize import normalize, stats as normalize_stats
+from similarity import get_detector, SIMILAR_CATEGORY
+from scan import BatchScanner, MAX_BATCH, CHUNK_SIZE
+from webhooks import WebhookDispatcher
+from events import LiveFeed
+import metrics
+from metrics import MetricsMiddleware, StageTimer, Gauge, CHAT_STAGES, CHAT_OUTCOMES
+from profiler import profiler, PROFILER_ENABLED, MIN_INTERVAL_MS, MAX_INTERVAL_MS
+from archive import Compactor
+from retrohunt import list_hunts, hunt_hits
 
 # --- CONFIGURATION ---
-# Initialize Groq Client
-# Ensure GROQ_API_KEY is set in your environment variables
-client = Groq(
-    api_key=os.environ.get("GROQ_API_KEY")
-)
-
 # Define the Model ID
 # You requested "openai/gpt-oss-120b"
 GROQ_MODEL = "openai/gpt-oss-120b" 
 
-app = FastAPI(title="HoneyPrompt Sentinel V3", version="3.0")
-
+SYSTEM_PROMPT = "You are a helpful and secure AI assistant. Answer the user's question clearly."
+COMPLETION_PARAMS = {"temperature": 0.7, "max_tokens": 1024, "top_p": 1, "stop": None}
+
+# How much of the model's reply to keep in logs.response for clean interactions
+# (unset = all of it, 0 = none). Attack rows always keep the decoy response.
+CLEAN_RESPONSE_LOG_CHARS = os.environ.get("LOG_CLEAN_RESPONSE_CHARS")
+CLEAN_RESPONSE_LOG_CHARS = int(CLEAN_RESPONSE_LOG_CHARS) if CLEAN_RESPONSE_LOG_CHARS else None
+
+# Async LLM provider (Groq by default, LLM_PROVIDER=fake for load tests).
+# Ensure GROQ_API_KEY is set in your environment variables (checked on the first LLM call, not at import).
+llm = get_provider(GROQ_MODEL)
+
+# Replies to clean prompts, reused for apps whose API key opts in (api_keys.cache_responses).
+response_cache = ResponseCache()
+
+@asynccontextmanager
+async def lifespan(app):
+    # Importing this module does no I/O: the schema check (a no-op unless a
+    # migration is pending) and the first rule snapshot happen here, before serving.
+    await asyncio.to_thread(db.init_db)
+    await asyncio.to_thread(rule_registry.rebuild)
+    # Logs/alerts are written behind the request; flush them before exiting.
+    await log_writer.start()
+    await usage_counter.start()
+    await rule_registry.start()
+    await change_watcher.start()
+    await webhook_dispatcher.start()
+    await live_feed.start()
+    await compactor.start()
+    if PROFILER_ENABLED:
+        profiler.start()  # lifespan runs on the event loop thread, which is what gets sampled
+    if similarity:
+        # Maps the vector index (seeding it from the logs on first run) without delaying startup.
+        app.state.similarity_load = asyncio.create_task(asyncio.to_thread(similarity.load, db))
+    yield
+    profiler.stop()
+    if similarity:
+        similarity.close()  # a first-run seeding stops at its next chunk; wait for it before db.close()
+        await asyncio.gather(app.state.similarity_load, return_exceptions=True)
+    await compactor.stop()
+    await live_feed.stop()
+    await change_watcher.stop()
+    await rule_registry.stop()
+    await usage_counter.stop()
+    await log_writer.stop()
+    await webhook_dispatcher.stop()  # undelivered alerts stay in the outbox for the next start
+    await llm.aclose()
+    batch_scanner.shutdown()
+    db.close()
+
+app = FastAPI(title="HoneyPrompt Sentinel V3", version="3.0", lifespan=lifespan)
+
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -31,6 +99,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- RULE REGISTRY ---
+# Decoy triggers + PATTERNS (+ RULES_FILE) compiled into one immutable snapshot.
+# Decoy CRUD and rules-file edits rebuild it in the background and swap it in.
+rule_registry = RuleRegistry(db)  # first snapshot built in lifespan()
+
+# Changes made by other worker processes (serve.py runs several) arrive through
+# the change_versions counters; each channel drops or rebuilds the local copy.
+change_watcher = ChangeWatcher(db)
+change_watcher.on("decoys", rule_registry.request_rebuild)
+change_watcher.on("blocks", db.block_cache.clear)
+change_watcher.on("api_keys", db.api_key_cache.clear)
+
+# Decayed per-session risk; drives escalations. Per-user risk lives in the shared risk_profiles table.
+risk_tracker = RiskTracker()
+
+# API-key usage is counted in memory and added to api_keys.usage_count periodically.
+usage_counter = UsageCounter(db)
+
+# Token buckets per API key and per user_email (limits from the api_keys row, see ratelimit.py).
+rate_limiter = RateLimiter()
+
+# Optional fuzzy matching against previously logged attacks (SIMILARITY_DETECTOR=1, needs NumPy).
+similarity = get_detector()
+if similarity:
+    log_writer.add_listener(similarity.on_logged)
+    change_watcher.on("similarity", lambda: asyncio.to_thread(similarity.refresh))
+
+# Detection-only screening for /api/scan/batch; large batches fan out to worker processes.
+batch_scanner = BatchScanner()
+
+# Alerts are queued per matching webhook alongside the alert row and POSTed in
+# batches by this background worker (retries with backoff, see webhooks.py).
+webhook_dispatcher = WebhookDispatcher(db)
+
+# Pushes alerts and counter deltas to dashboards over /api/events (SSE) instead of polling.
+live_feed = LiveFeed(db)
+
+# Moves months older than LOG_HOT_MONTHS out of logs/alerts into compressed archives (archive.py).
+compactor = Compactor(db)
+
+# Point-in-time values read when /metrics is scraped (stage/query histograms live in metrics.py).
+Gauge("honeyprompt_log_queue_depth", "Records waiting for the write-behind log writer.",
+      lambda: log_writer.queued)
+Gauge("honeyprompt_live_feed_subscribers", "Open /api/events streams.", lambda: live_feed.stats()["subscribers"])
+Gauge("honeyprompt_webhook_deliveries_in_flight", "Webhook POSTs currently running.",
+      lambda: webhook_dispatcher.in_flight)
+Gauge("honeyprompt_cache_hits", "Lookup cache hits by cache.",
+      lambda: {(name, ): c.hits for name, c in (("api_keys", db.api_key_cache), ("user_blocks", db.block_cache),
+                                                ("llm_responses", response_cache))}, ("cache",))
+Gauge("honeyprompt_cache_misses", "Lookup cache misses by cache.",
+      lambda: {(name, ): c.misses for name, c in (("api_keys", db.api_key_cache), ("user_blocks", db.block_cache),
+                                                  ("llm_responses", response_cache))}, ("cache",))
+
 # --- MODELS ---
 class RegisterRequest(BaseModel):
     name: str
@@ -42,10 +163,20 @@ class LoginRequest(BaseModel):
     email: str
     password: str
 
+# Placeholder for callers that send no user_email: not a real user, so it gets no per-user bucket.
+DEFAULT_USER_EMAIL = "user@test.com"
+
 class ChatMessage(BaseModel):
-    user_email: Optional[str] = "user@test.com" 
+    user_email: Optional[str] = DEFAULT_USER_EMAIL
     message: str
     session_id: Optional[str] = "default"
+    stream: bool = False  # opt-in: relay the reply as Server-Sent Events
+
+class ScanBatchRequest(BaseModel):
+    texts: List[str]
+    user_email: Optional[str] = "batch@scan"
+    session_id: Optional[str] = "batch"
+    log_clean: bool = False  # also log texts that passed (off by default: bulk screens are mostly clean)
 
 class DecoyCreate(BaseModel):
     title: str; category: str; content: str; triggers: str; is_active: bool = True
@@ -54,7 +185,11 @@ class WebhookCreate(BaseModel):
     name: str; url: str; min_risk_score: int = 70; is_active: bool = True
 
 class APIKeyCreate(BaseModel):
-    name: str; source_app: str = "External App"
+    name: str; source_app: str = "External App"; cache_responses: bool = False
+    rate_limit: Optional[int] = None; rate_burst: Optional[int] = None; user_rate_limit: Optional[int] = None
+
+class APIKeyLimits(BaseModel):
+    rate_limit: Optional[int] = None; rate_burst: Optional[int] = None; user_rate_limit: Optional[int] = None
 
 # --- AUTH ENDPOINTS ---
 
@@ -91,45 +226,137 @@ async def login(data: LoginRequest):
 
 # --- CHAT & DETECTION LOGIC ---
 
+def sse_event(payload, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+def chat_response(data, result):
+    """Returns the verdict as JSON, or as a one-chunk SSE stream when the caller asked to stream."""
+    if not data.stream:
+        return result
+
+    async def events():
+        yield sse_event({"token": result["response"]})
+        yield sse_event({k: v for k, v in result.items() if k != "response"}, event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+async def queue_log(record):
+    """Queues a log row for the writer and counts it in the live feed's next stats delta."""
+    await log_writer.log(record)
+    live_feed.logged(record)
+
+async def queue_alert(record):
+    """Queues an alert row for the writer and pushes it to live feed subscribers."""
+    await log_writer.alert(record)
+    live_feed.alert(record)
+
+async def track_risk(data, risk, source_app, timestamp):
+    """
+    Feeds one logged message to the session scorer and acts on its verdict.
+    Per-user scores and auto-blocks follow when the log is flushed (risk_profiles).
+    """
+    verdict = risk_tracker.observe(data.user_email, data.session_id, risk)
+    if verdict.escalate:
+        await queue_alert({
+            "id": str(uuid.uuid4()), "risk_score": 100, "categories": json.dumps(["session_escalation"]),
+            "message_preview": f"Escalation: session {data.session_id} risk score {verdict.session_score:.0f}",
+            "user_email": data.user_email, "is_read": 0, "source_app": source_app, "timestamp": timestamp,
+        })
+    return verdict
+
+async def log_attack(data, source_app, risk, cats, response_text, detections, preview, rules_version):
+    """Queues the log and alert rows for an intercepted message and feeds the session scorer."""
+    timestamp = datetime.now().isoformat()
+    await queue_log({
+        "id": str(uuid.uuid4()), "user_email": data.user_email, "message": data.message,
+        "session_id": data.session_id, "risk_score": risk, "threat_categories": json.dumps(cats),
+        "response": response_text, "source_app": source_app, "timestamp": timestamp,
+        "detections": json.dumps(detections), "cached": 0, "rules_version": rules_version,
+    })
+    await queue_alert({
+        "id": str(uuid.uuid4()), "message_preview": preview,
+        "risk_score": risk, "categories": json.dumps(cats), "user_email": data.user_email,
+        "is_read": 0, "source_app": source_app, "timestamp": timestamp,
+    })
+    await track_risk(data, risk, source_app, timestamp)
+
+def enforce_rate_limits(key_record, user_email, cost=1):
+    """
+    Raises 429 with Retry-After when the API key's or the user's token bucket cannot cover `cost` tokens.
+    Keyless requests are limited only if RATE_LIMIT_ANONYMOUS_PER_MIN is set, and the placeholder
+    user (no user_email sent) has no per-user bucket, so one noisy caller cannot throttle the rest.
+    """
+    def limit(column, default):
+        value = key_record[column] if key_record else None
+        return default if value is None else value
+
+    key_id = key_record['id'] if key_record else "anonymous"
+    rate = limit('rate_limit', DEFAULT_KEY_RATE if key_record else ANONYMOUS_RATE)
+    burst = limit('rate_burst', None)
+    if rate and cost > (burst or rate):
+        # Waiting never helps: the bucket cannot hold this many tokens.
+        raise HTTPException(status_code=429, detail=f"Request needs {cost} tokens, more than this API key's "
+                                                    f"burst of {burst or rate}; send smaller batches.")
+    wait = rate_limiter.acquire(f"key:{key_id}", rate, burst, cost)
+    if wait:
+        raise HTTPException(status_code=429, detail="Rate limit exceeded for this API key.",
+                            headers={"Retry-After": retry_after_header(wait)})
+    if user_email and user_email != DEFAULT_USER_EMAIL:
+        wait = rate_limiter.acquire(f"user:{user_email}", limit('user_rate_limit', DEFAULT_USER_RATE))
+        if wait:
+            raise HTTPException(status_code=429, detail="Rate limit exceeded for this user.",
+                                headers={"Retry-After": retry_after_header(wait)})
+
 @app.post("/api/chat")
 async def chat_proxy(data: ChatMessage, x_api_key: Optional[str] = Header(None)):
     """
-    1. Validates API Key -> Determines Source App.
+    1. Validates API Key -> Determines Source App, then applies its rate limits (429).
     2. Checks if User is Blocked.
     3. Scans for Honeypots/Attacks.
     4. IF CLEAN -> Sends to Groq (openai/gpt-oss-120b).
     """
     
+    stages = StageTimer(CHAT_STAGES)  # per-stage latency -> honeyprompt_chat_stage_seconds
+
     # 1. IDENTIFY SOURCE APP
     source_app = "Chatbot" # Default
-    if x_api_key:
-        key_record = db.query("SELECT source_app FROM api_keys WHERE key_value = ?", (x_api_key,), one=True)
-        if key_record:
-            source_app = key_record['source_app']
+    use_cache = False
+    key_record = db.resolve_api_key(x_api_key) if x_api_key else None
+    stages.mark("api_key")
+
+    # 1b. RATE LIMITS (before any scanning or upstream spend)
+    try:
+        enforce_rate_limits(key_record, data.user_email)
+    except HTTPException:
+        CHAT_OUTCOMES.inc("rate_limited")
+        raise
+    stages.mark("rate_limit")
+
+    if key_record:
+        source_app = key_record['source_app']
+        use_cache = bool(key_record['cache_responses'])
+        usage_counter.incr(key_record['id'])
             
     # 2. CHECK BLOCK STATUS
     if data.user_email:
         is_blocked, reason = db.is_user_blocked(data.user_email)
+        stages.mark("block_check")
         if is_blocked:
-            return {
+            CHAT_OUTCOMES.inc("blocked")
+            return chat_response(data, {
                 "response": f"🚫 ACCESS DENIED. Your account has been suspended: {reason}",
                 "is_attack": True,
                 "risk_score": 100,
                 "categories": ["blocked_user"]
-            }
-
-    # 3. SCAN FOR ATTACKS / HONEYPOTS
-    msg_lower = data.message.lower()
-    active_decoys = db.query("SELECT * FROM decoys WHERE is_active = 1")
-    triggered_decoy = None
-    
-    for decoy in active_decoys:
-        triggers = [t.strip().lower() for t in decoy['triggers'].split(',')]
-        for t in triggers:
-            if t and t in msg_lower:
-                triggered_decoy = decoy
-                break
-        if triggered_decoy: break
+            })
+
+    # 3. SCAN FOR ATTACKS / HONEYPOTS (on the normalized form: folds leetspeak, homoglyphs,
+    # zero-width splits and encoded payloads; offsets below refer to that form)
+    rules = rule_registry.current  # one snapshot for the whole request
+    trigger_hit = rules.matcher.first_match(normalize(data.message))
+    triggered_decoy = trigger_hit.decoy if trigger_hit else None
+    stages.mark("scan")
             
     # 4. HANDLE ATTACK (Intercept & Block)
     if triggered_decoy:
@@ -143,66 +370,161 @@ async def chat_proxy(data: ChatMessage, x_api_key: Optional[str] = Header(None))
         else:
             response_text = triggered_decoy['content']
 
-        # Log Attack to DB
-        log_id = str(uuid.uuid4())
-        timestamp = datetime.now().isoformat()
-        
-        db.execute("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                   (log_id, data.user_email, data.message, data.session_id, risk, 
-                    json.dumps(cats), response_text, "[]", source_app, timestamp))
-        
-        db.execute("INSERT INTO alerts VALUES (?, ?, ?, ?, ?, 0, ?, ?)",
-                   (str(uuid.uuid4()), f"Triggered: {triggered_decoy['title']}", risk, json.dumps(cats), data.user_email, source_app, timestamp))
-        
-        return {
+        # Log Attack (queued; written in the background with the trigger and offset that fired)
+        await log_attack(data, source_app, risk, cats, response_text,
+                         [{"trigger": trigger_hit.trigger, "offset": trigger_hit.start}],
+                         f"Triggered: {triggered_decoy['title']}", rules.version)
+        stages.mark("log")
+        CHAT_OUTCOMES.inc("decoy")
+
+        return chat_response(data, {
             "response": response_text,
             "is_attack": True,
             "risk_score": risk,
             "categories": cats
-        }
+        })
+
+    # 4b. FUZZY MATCH AGAINST KNOWN ATTACKS (paraphrases the exact triggers miss)
+    if similarity:
+        similar = await asyncio.to_thread(similarity.check, data.message)
+        stages.mark("similarity")
+        if similar:
+            risk = min(100, round(similar.risk * similar.score))
+            cats = [SIMILAR_CATEGORY]
+            response_text = "⚠️ Request blocked: this prompt closely matches a known attack."
+            await log_attack(data, source_app, risk, cats, response_text,
+                             [{"similar_to": similar.log_id, "score": similar.score}],
+                             f"Similar to: {similar.preview}", rules.version)
+            stages.mark("log")
+            CHAT_OUTCOMES.inc("similar")
+            return chat_response(data, {
+                "response": response_text,
+                "is_attack": True,
+                "risk_score": risk,
+                "categories": cats
+            })
 
     # 5. SAFE REQUEST -> SEND TO GROQ (Real AI Response)
-    try:
-        completion = client.chat.completions.create(
-            model=GROQ_MODEL,
-            messages=[
-                {
-                    "role": "system", 
-                    "content": "You are a helpful and secure AI assistant. Answer the user's question clearly."
-                },
-                {
-                    "role": "user", 
-                    "content": data.message
-                }
-            ],
-            temperature=0.7,
-            max_tokens=1024,
-            top_p=1,
-            stream=False,
-            stop=None,
-        )
-
-        ai_response = completion.choices[0].message.content
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": data.message},
+    ]
 
+    async def log_safe(ai_response, cached=False):
         # Log Safe Interaction (Optional: risk_score 0)
-        log_id = str(uuid.uuid4())
         timestamp = datetime.now().isoformat()
-        db.execute("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                   (log_id, data.user_email, data.message, data.session_id, 0, 
-                    json.dumps([]), ai_response, "[]", source_app, timestamp))
-
-        return {
-            "response": ai_response,
-            "is_attack": False,
-            "risk_score": 0,
-            "categories": []
-        }
-
-    except Exception as e:
+        if CLEAN_RESPONSE_LOG_CHARS is not None:
+            ai_response = (ai_response or "")[:CLEAN_RESPONSE_LOG_CHARS] or None
+        await queue_log({
+            "id": str(uuid.uuid4()), "user_email": data.user_email, "message": data.message,
+            "session_id": data.session_id, "risk_score": 0, "threat_categories": json.dumps([]),
+            "response": ai_response, "detections": "[]", "source_app": source_app,
+            "timestamp": timestamp, "cached": int(cached), "rules_version": rules.version,
+        })
+        await track_risk(data, 0, source_app, timestamp)
+
+    if data.stream:
+        async def relay():
+            parts = []
+            try:
+                async for chunk in llm.stream(messages, **COMPLETION_PARAMS):
+                    parts.append(chunk)
+                    yield sse_event({"token": chunk})
+            except ProviderError as e:
+                print(f"❌ Groq API Error: {e}")
+                yield sse_event({"detail": "AI Service currently unavailable."}, event="error")
+                return
+            stages.mark("llm")
+            # The full reply is logged once the stream has finished.
+            await log_safe("".join(parts))
+            stages.mark("log")
+            CHAT_OUTCOMES.inc("stream")
+            yield sse_event({"is_attack": False, "risk_score": 0, "categories": []}, event="done")
+
+        return StreamingResponse(relay(), media_type="text/event-stream")
+
+    try:
+        if use_cache:
+            key = cache_key(data.message, GROQ_MODEL, SYSTEM_PROMPT, COMPLETION_PARAMS)
+            ai_response, cached = await response_cache.get_or_fetch(
+                key, lambda: llm.complete(messages, **COMPLETION_PARAMS))
+        else:
+            ai_response, cached = await llm.complete(messages, **COMPLETION_PARAMS), False
+    except ProviderTimeout as e:
+        CHAT_OUTCOMES.inc("llm_timeout")
+        print(f"❌ Groq API Timeout: {e}")
+        raise HTTPException(status_code=504, detail="AI Service timed out.")
+    except ProviderError as e:
+        CHAT_OUTCOMES.inc("llm_error")
         print(f"❌ Groq API Error: {e}")
         # Fail gracefully if AI is down
         raise HTTPException(status_code=500, detail="AI Service currently unavailable.")
 
+    stages.mark("llm")
+    await log_safe(ai_response, cached)
+    stages.mark("log")
+    CHAT_OUTCOMES.inc("cached" if cached else "clean")
+
+    return {
+        "response": ai_response,
+        "is_attack": False,
+        "risk_score": 0,
+        "categories": []
+    }
+
+
+@app.post("/api/scan/batch")
+async def scan_batch(data: ScanBatchRequest, x_api_key: Optional[str] = Header(None)):
+    """
+    Runs only the detection stage (decoy triggers + pattern rules) over many
+    texts, e.g. RAG chunks or uploaded documents. No LLM call is made.
+    """
+    if len(data.texts) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH} texts per batch")
+
+    # Resolved once for the whole batch, and rate limited one token per scan chunk
+    source_app = "Batch Scan"
+    key_record = db.resolve_api_key(x_api_key) if x_api_key else None
+    enforce_rate_limits(key_record, None, cost=max(1, math.ceil(len(data.texts) / CHUNK_SIZE)))
+    if key_record:
+        source_app = key_record['source_app']
+        usage_counter.incr(key_record['id'], len(data.texts))
+
+    rules = rule_registry.current  # the whole batch is scored with one snapshot
+    verdicts = await batch_scanner.scan(rules, data.texts)
+    if similarity:
+        clean = [i for i, v in enumerate(verdicts) if not v["is_attack"]]
+        matches = await asyncio.to_thread(similarity.check_many, [data.texts[i] for i in clean])
+        for i, similar in zip(clean, matches):
+            if similar:
+                verdicts[i].update(is_attack=True, risk_score=min(100, round(similar.risk * similar.score)),
+                                   categories=[SIMILAR_CATEGORY],
+                                   detections=[{"similar_to": similar.log_id, "score": similar.score}])
+
+    timestamp = datetime.now().isoformat()
+    records = [{
+        "id": str(uuid.uuid4()), "user_email": data.user_email, "message": text,
+        "session_id": data.session_id, "risk_score": v["risk_score"],
+        "threat_categories": json.dumps(v["categories"]), "response": None,
+        "detections": json.dumps(v["detections"]), "source_app": source_app, "timestamp": timestamp,
+        "cached": 0, "rules_version": rules.version,
+    } for text, v in zip(data.texts, verdicts) if v["is_attack"] or data.log_clean]
+    if records:
+        for record in records:
+            live_feed.logged(record)
+        # One transaction for the whole batch. Scanned documents are not a user's own messages,
+        # so they stay out of the risk profiles and auto-blocks.
+        await asyncio.to_thread(db.insert_logs, records, False)
+        if similarity:
+            await asyncio.to_thread(similarity.on_logged, records)
+
+    return {
+        "results": verdicts,
+        "rules_version": rules.version,
+        "total": len(verdicts),
+        "attacks": sum(1 for v in verdicts if v["is_attack"]),
+    }
+
 
 # --- STANDARD ENDPOINTS ---
 
@@ -213,48 +535,143 @@ async def get_dashboard_stats(): return db.get_dashboard_stats()
 async def get_alerts(unread_only: bool = False, limit: int = 10):
     sql = "SELECT * FROM alerts"
     if unread_only: sql += " WHERE is_read = 0"
-    sql += f" ORDER BY timestamp DESC LIMIT {limit}"
-    alerts = db.query(sql)
+    sql += " ORDER BY timestamp DESC LIMIT ?"  # idx_alerts_unread / idx_alerts_timestamp
+    alerts = db.query(sql, (limit,))
     for a in alerts:
         try: a["categories"] = json.loads(a["categories"])
         except: a["categories"] = []
     count = db.query("SELECT COUNT(*) as c FROM alerts WHERE is_read = 0", one=True)['c']
     return {"alerts": alerts, "unread_count": count}
 
+@app.get("/api/events")
+async def live_events():
+    """
+    Server-Sent Events: "alert" for each new alert, "stats" with counter deltas
+    to add to /api/dashboard/stats. Subscribe first, then load the snapshot.
+    A "dropped" event means the client fell behind; reconnect and reload.
+    """
+    sub = live_feed.subscribe()
+    if sub is None:
+        raise HTTPException(status_code=503, detail="Too many live feed subscribers.")
+    return StreamingResponse(live_feed.stream(sub), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/api/alerts/read-all")
 async def mark_alerts_read():
     db.execute("UPDATE alerts SET is_read = 1")
     return {"success": True}
 
+# --- ATTACK LOG PAGING & EXPORT ---
+# Approximate totals per category filter (None = all logs), reused for 30 seconds.
+total_cache = TTLCache(maxsize=256, ttl=30)
+
+def encode_cursor(row):
+    return base64.urlsafe_b64encode(json.dumps([row["timestamp"], row["id"]]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        timestamp, log_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(timestamp), str(log_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def cached_total(category=None):
+    return total_cache.get_or_load(category, lambda: db.count_logs(category))
+
 @app.get("/api/attacks")
-async def get_attacks(limit: int = 50, skip: int = 0):
-    attacks = db.query(f"SELECT * FROM logs ORDER BY timestamp DESC LIMIT {limit} OFFSET {skip}")
-    total = db.query("SELECT COUNT(*) as c FROM logs", one=True)['c']
+async def get_attacks(limit: int = 50, cursor: Optional[str] = None, category: Optional[str] = None,
+                      include_total: bool = True, skip: int = 0):
+    """
+    Newest-first page of logs. Pass the returned next_cursor back to get the following page.
+    `skip` (deprecated) is the old OFFSET paging, honoured only when no cursor is given.
+    """
+    limit = max(1, min(limit, 1000))
+    if cursor:
+        attacks = db.page_logs(limit, decode_cursor(cursor), category)
+    else:
+        attacks = db.page_logs(limit, None, category, offset=max(0, skip))
     for a in attacks:
         try: a["categories"] = json.loads(a["threat_categories"])
         except: a["categories"] = []
-    return {"attacks": attacks, "total": total}
+    return {
+        "attacks": attacks,
+        "next_cursor": encode_cursor(attacks[-1]) if len(attacks) == limit else None,
+        "total": cached_total(category) if include_total else None,  # approximate (cached)
+    }
+
+@app.get("/api/attacks/export")
+def export_attacks(format: str = "ndjson", category: Optional[str] = None):
+    """Streams every log (newest first) as NDJSON or CSV, straight from the keyset cursor."""
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+
+    def ndjson_rows():
+        for row in db.iter_logs(category):
+            yield json.dumps(row) + "\n"
+
+    def csv_rows():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(LOG_COLUMNS)
+        for i, row in enumerate(db.iter_logs(category), start=1):
+            writer.writerow([row.get(col) for col in LOG_COLUMNS])
+            if i % 500 == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+
+    stamp = datetime.now().strftime("%Y%m%d")
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    return StreamingResponse(
+        ndjson_rows() if format == "ndjson" else csv_rows(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="honeyprompt_logs_{stamp}.{format}"'},
+    )
+
+@app.get("/api/archives")
+async def get_archives():
+    """Compressed months moved out of logs/alerts, plus the retention settings."""
+    return {"archives": await asyncio.to_thread(compactor.archives), **await asyncio.to_thread(compactor.stats)}
+
+@app.get("/api/archives/search")
+async def search_archives(table: str = "logs", start: Optional[str] = None, end: Optional[str] = None,
+                          user_email: Optional[str] = None, category: Optional[str] = None,
+                          q: Optional[str] = None, limit: int = 100):
+    """Investigations over archived months (streamed from the files; months outside start..end are skipped)."""
+    if table not in ("logs", "alerts"):
+        raise HTTPException(status_code=400, detail="table must be 'logs' or 'alerts'")
+    rows = await asyncio.to_thread(compactor.search, table, start, end, user_email, category, q, min(limit, 1000))
+    return {"results": rows, "count": len(rows)}
+
+@app.get("/api/retro-hunts")
+async def get_retro_hunts():
+    """Recent retro-hunts (run with `python manage.py retro-hunt`) with their progress."""
+    return await asyncio.to_thread(list_hunts, db)
+
+@app.get("/api/retro-hunts/{hunt_id}/hits")
+async def get_retro_hunt_hits(hunt_id: str, only_new: bool = False, limit: int = 100, offset: int = 0):
+    """Past messages the hunt's rules flag; only_new keeps those with categories missed at the time."""
+    rows = await asyncio.to_thread(hunt_hits, db, hunt_id, only_new, min(limit, 1000), offset)
+    return {"results": rows, "count": len(rows)}
 
 @app.get("/api/profiles")
 async def get_threat_profiles():
-    sql = """
-    SELECT user_email, COUNT(*) as total_attacks, MAX(timestamp) as last_seen,
-            AVG(risk_score) as avg_risk, COUNT(DISTINCT session_id) as session_count
-    FROM logs GROUP BY user_email ORDER BY avg_risk DESC
-    """
-    profiles = db.query(sql)
+    """Served from risk_profiles, which every worker updates as its logs are flushed (no log scan)."""
+    profiles = await asyncio.to_thread(db.get_risk_profiles)
     formatted = []
     for p in profiles:
         avg = p["avg_risk"]
         level = "CRITICAL" if avg > 80 else "HIGH" if avg > 50 else "MEDIUM" if avg > 20 else "LOW"
-        is_blocked, _ = db.is_user_blocked(p['user_email'])
+        is_blocked, _ = db.is_user_blocked(p['user_email'])  # cached
         formatted.append({
             "email": p["user_email"],
             "name": p["user_email"].split('@')[0],
             "threat_level": level,
-            "total_attacks": p["total_attacks"],
+            "total_attacks": p["messages"],
             "avg_risk": int(avg),
-            "session_count": p["session_count"],
+            "risk_score": p["risk_score"],
+            "session_count": p["sessions"],
             "last_active": p["last_seen"],
             "status": "Blocked" if is_blocked else "Active"
         })
@@ -272,15 +689,26 @@ async def get_decoys(): return {"decoys": db.query("SELECT * FROM decoys")}
 @app.post("/api/decoys")
 async def create_decoy(data: DecoyCreate):
     uid = str(uuid.uuid4())
-    db.execute("INSERT INTO decoys VALUES (?, ?, ?, ?, ?, ?)", 
-               (uid, data.title, data.category, data.content, data.triggers, data.is_active))
+    with db.transaction():
+        db.execute("INSERT INTO decoys VALUES (?, ?, ?, ?, ?, ?)", 
+                   (uid, data.title, data.category, data.content, data.triggers, data.is_active))
+        db.notify_change("decoys")
+    rule_registry.request_rebuild()
     return {"id": uid, **data.dict()}
 
 @app.delete("/api/decoys/{id}")
 async def delete_decoy(id: str):
-    db.execute("DELETE FROM decoys WHERE id = ?", (id,))
+    with db.transaction():
+        db.execute("DELETE FROM decoys WHERE id = ?", (id,))
+        db.notify_change("decoys")
+    rule_registry.request_rebuild()
     return {"success": True}
 
+@app.get("/api/rules")
+async def get_rules():
+    """The rule snapshot requests are currently scored with."""
+    return rule_registry.stats()
+
 @app.get("/api/webhooks")
 async def get_webhooks(): return {"webhooks": db.query("SELECT * FROM webhooks")}
 
@@ -293,9 +721,57 @@ async def create_webhook(data: WebhookCreate):
 
 @app.delete("/api/webhooks/{id}")
 async def delete_webhook(id: str):
-    db.execute("DELETE FROM webhooks WHERE id = ?", (id,))
+    with db.transaction():
+        db.execute("DELETE FROM webhooks WHERE id = ?", (id,))
+        db.execute("DELETE FROM webhook_outbox WHERE webhook_id = ?", (id,))
     return {"success": True}
 
+@app.get("/api/webhooks/stats")
+async def get_webhook_stats():
+    """Delivery counters for this worker and outbox rows by status (pending / dead)."""
+    return await asyncio.to_thread(webhook_dispatcher.stats)
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters for the in-memory lookup caches."""
+    return {
+        "api_keys": db.api_key_cache.stats(),
+        "user_blocks": db.block_cache.stats(),
+        "attack_totals": total_cache.stats(),
+        "llm_responses": response_cache.stats(),
+        "risk_tracker": risk_tracker.stats(),
+        "normalized_messages": normalize_stats(),
+        "similarity_index": similarity.stats() if similarity else None,
+        "rate_limits": rate_limiter.stats(),
+        "live_feed": live_feed.stats(),
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint (text exposition format) for this worker process."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+class ProfilerToggle(BaseModel):
+    enabled: bool
+    interval_ms: Optional[float] = None
+
+@app.post("/api/debug/profiler")
+async def toggle_profiler(data: ProfilerToggle):
+    """Starts (clearing the previous profile) or stops the sampling profiler on this worker."""
+    if data.interval_ms is not None and not MIN_INTERVAL_MS <= data.interval_ms <= MAX_INTERVAL_MS:
+        raise HTTPException(status_code=400,
+                            detail=f"interval_ms must be between {MIN_INTERVAL_MS} and {MAX_INTERVAL_MS}")
+    if data.enabled:
+        profiler.start(interval_ms=data.interval_ms)  # called on the event loop thread: samples it
+    else:
+        profiler.stop()
+    return profiler.stats()
+
+@app.get("/api/debug/profiler")
+async def get_profile(limit: int = 200):
+    """Sampled event-loop stacks in collapsed format ("frame;frame;... count"), hottest first."""
+    return PlainTextResponse(profiler.collapsed(limit))
+
 @app.get("/api/apikeys")
 async def get_api_keys(): return {"keys": db.query("SELECT * FROM api_keys")}
 
@@ -305,15 +781,40 @@ async def create_api_key(data: APIKeyCreate):
     uid = str(uuid.uuid4())
     key_value = f"hp_live_{secrets.token_urlsafe(16)}"
     timestamp = datetime.now().isoformat()
-    db.execute("INSERT INTO api_keys VALUES (?, ?, ?, ?, ?, ?, ?)", 
-               (uid, data.name, key_value, data.source_app, True, 0, timestamp))
+    with db.transaction():
+        db.execute("INSERT INTO api_keys (id, name, key_value, source_app, is_active, usage_count, created_at, "
+                   "cache_responses, rate_limit, rate_burst, user_rate_limit) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                   (uid, data.name, key_value, data.source_app, True, 0, timestamp, data.cache_responses,
+                    data.rate_limit, data.rate_burst, data.user_rate_limit))
+        db.notify_change("api_keys")
+    db.api_key_cache.invalidate(key_value)
     return {"id": uid, "name": data.name, "key": key_value, "created_at": timestamp}
 
+@app.put("/api/apikeys/{id}/limits")
+async def set_api_key_limits(id: str, data: APIKeyLimits):
+    """Sets requests/minute for the key, its burst, and requests/minute per user_email (null = default)."""
+    key = db.query("SELECT key_value FROM api_keys WHERE id = ?", (id,), one=True)
+    if not key:
+        raise HTTPException(status_code=404, detail="API key not found")
+    with db.transaction():
+        db.execute("UPDATE api_keys SET rate_limit = ?, rate_burst = ?, user_rate_limit = ? WHERE id = ?",
+                   (data.rate_limit, data.rate_burst, data.user_rate_limit, id))
+        db.notify_change("api_keys")
+    db.api_key_cache.invalidate(key['key_value'])
+    return {"id": id, **data.dict()}
+
 @app.delete("/api/apikeys/{id}")
 async def revoke_api_key(id: str):
-    db.execute("DELETE FROM api_keys WHERE id = ?", (id,))
+    key = db.query("SELECT key_value FROM api_keys WHERE id = ?", (id,), one=True)
+    with db.transaction():
+        db.execute("DELETE FROM api_keys WHERE id = ?", (id,))
+        db.notify_change("api_keys")
+    if key:
+        db.api_key_cache.invalidate(key['key_value'])
     return {"success": True}
 
 if __name__ == "__main__":
+    # Development server (auto-reload). For several workers use serve.py.
+    import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
     
\ No newline at end of file
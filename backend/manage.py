@@ -0,0 +1,97 @@
+"""
+Maintenance commands for the HoneyPrompt backend.
+
+    python manage.py backfill-stats     # rebuild dashboard rollups from the logs table and archives
+    python manage.py compact            # archive months older than LOG_HOT_MONTHS, apply retention
+    python manage.py retro-hunt         # rescan past logs with the current rules (--archives, --resume ID)
+    python manage.py import-attack-log  # move the legacy attacks.json into the NDJSON log
+"""
+import argparse
+import time
+
+
+def backfill_stats(args):
+    from database import db
+    from archive import Compactor
+    start = time.perf_counter()
+    total = db.backfill_stats()
+    archived = Compactor(db).backfill_rollups()
+    print(f"✅ Rollups rebuilt from {total} live + {archived} archived log rows in {time.perf_counter() - start:.2f}s")
+
+
+def compact(args):
+    from database import db
+    from archive import Compactor
+    compactor = Compactor(db)
+    if not (compactor.hot_months or compactor.retention_months):
+        raise SystemExit("❌ Compaction is off: set LOG_HOT_MONTHS (and optionally LOG_RETENTION_MONTHS)")
+    start = time.perf_counter()
+    done = compactor.run_once()
+    months = sum(len(m) for m in done.values())
+    print(f"✅ Archived {months} table-months in {time.perf_counter() - start:.2f}s: {compactor.stats()}")
+
+
+def retro_hunt(args):
+    from database import db
+    from rules import RuleRegistry
+    from archive import Compactor
+    from retrohunt import RetroHunt, list_hunts, HUNT_WORKERS
+    if args.list:
+        for h in list_hunts(db):
+            print(f"{h['id']}  {h['status']:11s} rules {h['rules_version']}  {h['scanned']}/{h['total_rows']} rows  "
+                  f"{h['hits']} hits ({h['new_hits']} new)  {h['started_at']}")
+        return
+    hunt = RetroHunt(db, RuleRegistry(db).rebuild(), workers=args.workers or HUNT_WORKERS, compactor=Compactor(db))
+    try:
+        hunt.load(args.resume) if args.resume else hunt.create(include_archives=args.archives)
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+    print(f"🔎 [RETRO-HUNT]: {hunt.hunt['id']} with rules {hunt.rules.version}, {hunt.workers} workers")
+    start = time.perf_counter()
+    try:
+        result = hunt.run()
+    except KeyboardInterrupt:
+        raise SystemExit(f"⏸️  Interrupted; continue with: python manage.py retro-hunt --resume {hunt.hunt['id']}")
+    elapsed = time.perf_counter() - start
+    print(f"✅ Retro-hunt {result['id']}: {result['scanned']} rows, {result['hits']} hits "
+          f"({result['new_hits']} not flagged at the time) in {elapsed:.2f}s")
+
+
+def import_attack_log(args):
+    import logger
+    count = logger.import_legacy_file()
+    logger.get_sink().close()
+    print(f"✅ Imported {count} entries from {logger.LOG_FILE} into {logger.LOG_DIR}/")
+
+
+COMMANDS = {
+    "backfill-stats": (backfill_stats, "Rebuild the dashboard rollup tables from existing logs."),
+    "compact": (compact, "Archive months older than LOG_HOT_MONTHS and delete expired archives."),
+    "retro-hunt": (retro_hunt, "Rescan historical logs with the current decoys and patterns."),
+    "import-attack-log": (import_attack_log, "Append the legacy attacks.json file to the NDJSON attack log."),
+}
+
+# Per-command options: name -> [(flags, argparse kwargs)]
+OPTIONS = {
+    "retro-hunt": [
+        (("--archives",), {"action": "store_true", "help": "also scan the compressed monthly archives"}),
+        (("--resume",), {"metavar": "HUNT_ID", "help": "continue an interrupted hunt from its checkpoint"}),
+        (("--workers",), {"type": int, "default": None, "help": "scan processes (default RETRO_HUNT_WORKERS)"}),
+        (("--list",), {"action": "store_true", "help": "show recent hunts and exit"}),
+    ],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HoneyPrompt maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        command = sub.add_parser(name, help=help_text)
+        for flags, kwargs in OPTIONS.get(name, []):
+            command.add_argument(*flags, **kwargs)
+    args = parser.parse_args()
+    COMMANDS[args.command][0](args)
+
+
+if __name__ == "__main__":
+    main()
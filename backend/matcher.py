@@ -0,0 +1,141 @@
+import re
+from collections import namedtuple
+from normalize import fold_term
+
+# A single trigger hit: which decoy fired, on which trigger, and where in the message.
+TriggerMatch = namedtuple("TriggerMatch", ["decoy", "trigger", "start", "end"])
+
+_WORD_CHAR = re.compile(r"\w")
+
+
+def split_triggers(raw):
+    """Splits a decoy's comma-separated trigger string into terms folded like normalized messages."""
+    return [fold_term(t) for t in (raw or "").split(",") if t.strip()]
+
+
+def _build_trie(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+    return trie
+
+
+def _trie_to_regex(node):
+    """
+    Turns a trie into a prefix-factored alternation, so the regex engine
+    branches on one character at a time instead of retrying every trigger.
+    Optional tails are greedy, which makes the longest trigger win at a position.
+    """
+    branches = [re.escape(ch) + _trie_to_regex(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        return "(?:" + body + ")?"
+    return body
+
+
+class LiteralScanner:
+    """
+    Finds every occurrence of a set of literal strings in one regex pass,
+    including overlapping ones. Callers pass already-lowercased text.
+    """
+
+    def __init__(self, words, word_boundary=False):
+        self.words = set(words)
+        self.word_boundary = word_boundary
+        self._prefixes = self._collect_prefixes()
+        self._regex = self._compile()
+
+    def __len__(self):
+        return len(self.words)
+
+    def _compile(self):
+        if not self.words:
+            return None
+        alternation = _trie_to_regex(_build_trie(self.words))
+        if self.word_boundary:
+            alternation = r"(?<!\w)" + alternation + r"(?!\w)"
+        # Zero-width lookahead so overlapping words at later offsets are still found.
+        return re.compile("(?=(" + alternation + "))")
+
+    def _collect_prefixes(self):
+        """
+        The regex reports the longest word starting at each offset, so record
+        which shorter words are prefixes of it (and would also have matched there).
+        """
+        prefixes = {}
+        for word in self.words:
+            found = []
+            for end in range(1, len(word)):
+                candidate = word[:end]
+                if candidate not in self.words:
+                    continue
+                if self.word_boundary and _WORD_CHAR.match(word[end]):
+                    continue
+                found.append(candidate)
+            if found:
+                prefixes[word] = found
+        return prefixes
+
+    def finditer(self, text):
+        """Yields (word, start offset) for every occurrence, ordered by offset."""
+        if self._regex is None or not text:
+            return
+        for m in self._regex.finditer(text):
+            start, longest = m.start(1), m.group(1)
+            yield longest, start
+            for word in self._prefixes.get(longest, ()):
+                yield word, start
+
+
+class TriggerMatcher:
+    """
+    Matches a message against every active decoy trigger in one regex pass.
+    Build it once from the decoy rows and rebuild it when the decoys change.
+    """
+
+    def __init__(self, decoys, word_boundary=True):
+        self.decoys = list(decoys)
+        self.word_boundary = word_boundary
+
+        # trigger -> indexes of the decoys that own it (a trigger may be shared)
+        self._owners = {}
+        for idx, decoy in enumerate(self.decoys):
+            for trigger in split_triggers(decoy.get("triggers")):
+                owners = self._owners.setdefault(trigger, [])
+                if idx not in owners:
+                    owners.append(idx)
+
+        self._scanner = LiteralScanner(self._owners, word_boundary=word_boundary)
+
+    def __len__(self):
+        return len(self._owners)
+
+    def _hits(self, text):
+        """Yields (decoy index, TriggerMatch) for every trigger occurrence."""
+        for trigger, start in self._scanner.finditer(text.lower() if text else text):
+            for idx in self._owners[trigger]:
+                yield idx, TriggerMatch(self.decoys[idx], trigger, start, start + len(trigger))
+
+    def find_all(self, text):
+        """Returns every trigger hit in the message, ordered by offset."""
+        return [m for _, m in self._hits(text)]
+
+    def matched_decoys(self, text):
+        """Returns each decoy hit by the message once, in decoy order."""
+        return [self.decoys[idx] for idx in sorted({idx for idx, _ in self._hits(text)})]
+
+    def first_match(self, text):
+        """
+        Returns the earliest hit of the first decoy (in decoy order) the message
+        triggers, keeping the priority of the old per-decoy loop. None if nothing fired.
+        """
+        best_idx, best = None, None
+        for idx, m in self._hits(text):
+            if best is None or idx < best_idx:
+                best_idx, best = idx, m
+        return best
@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# --- METRICS ---
+# Minimal in-process Prometheus instruments (no client library needed).
+# Each observation is a bisect plus a locked increment, cheap enough to leave
+# on in production. Values are per process: with several workers (serve.py),
+# every worker exposes its own series (see honeyprompt_process_info{pid}).
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observe(seconds, *label_values)."""
+
+    def __init__(self, name, doc, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in snapshot:
+            running = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                running += count
+                le = ("le", bound if bound == "+Inf" else repr(float(bound)))
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [le])} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {running}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter; inc(*label_values, amount=1)."""
+
+    def __init__(self, name, doc, labelnames=()):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in items)
+        return lines
+
+
+class Gauge:
+    """Read at scrape time from `fn`, which returns a number or {label_values_tuple: number}."""
+
+    def __init__(self, name, doc, fn, labelnames=()):
+        self.name, self.doc, self.fn, self.labelnames = name, doc, fn, tuple(labelnames)
+        _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"❌ Gauge {self.name} failed: {e}")
+            return lines
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        lines.extend(f"{self.name}{_labels(self.labelnames, labels)} {v}" for labels, v in items if v is not None)
+        return lines
+
+
+class StageTimer:
+    """Times consecutive stages of one request: each mark() records the time since the previous one."""
+    __slots__ = ("histogram", "_last")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self._last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.histogram.observe(now - self._last, stage)
+        self._last = now
+
+
+class MetricsMiddleware:
+    """Raw ASGI middleware timing every HTTP request by route template (no per-request task or body copy)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")  # template, so ids don't explode the labels
+            HTTP_REQUESTS.observe(time.perf_counter() - start, scope["method"], route, status)
+
+
+def render():
+    """The whole registry in the Prometheus text exposition format (version 0.0.4)."""
+    lines = ["# HELP honeyprompt_process_info The worker process this scrape came from.",
+             "# TYPE honeyprompt_process_info gauge", f'honeyprompt_process_info{{pid="{os.getpid()}"}} 1']
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- SHARED INSTRUMENTS ---
+HTTP_REQUESTS = Histogram("honeyprompt_http_request_duration_seconds", "HTTP request latency by route.",
+                          ("method", "route", "status"))
+CHAT_STAGES = Histogram("honeyprompt_chat_stage_seconds", "Time spent in each /api/chat stage.", ("stage",))
+CHAT_OUTCOMES = Counter("honeyprompt_chat_requests_total", "/api/chat requests by how they were answered.",
+                        ("outcome",))
+DB_QUERIES = Histogram("honeyprompt_db_query_seconds", "SQLite statement latency by Database helper.", ("op",))
+LOG_FLUSHES = Histogram("honeyprompt_log_flush_seconds", "Write-behind flush (one transaction) latency.")
+LOG_RECORDS = Counter("honeyprompt_log_records_total", "Rows written by the log writer.", ("table",))
@@ -0,0 +1,197 @@
+import base64
+import binascii
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+# --- NORMALIZATION CONFIGURATION ---
+NORMALIZE_CACHE_SIZE = int(os.environ.get("NORMALIZE_CACHE_SIZE", "4096"))  # recent messages kept
+DECODE_PROBE = os.environ.get("NORMALIZE_DECODE_PROBE", "1") == "1"         # look inside base64/hex blobs
+MAX_DECODED = 8                                                              # blobs decoded per message
+
+# Zero-width and other invisible format characters used to split trigger words.
+_INVISIBLE = re.compile("[\u00ad\u180e\u200b-\u200f\u2060-\u2064\ufeff]")
+
+# Common homoglyphs NFKC leaves alone (Cyrillic / Greek lookalikes of Latin letters).
+_CONFUSABLES = {
+    "а": "a", "в": "b", "с": "c", "е": "e", "һ": "h", "і": "i", "ј": "j", "к": "k", "м": "m",
+    "н": "h", "о": "o", "р": "p", "ѕ": "s", "т": "t", "у": "y", "х": "x", "ԁ": "d", "ԛ": "q",
+    "ԝ": "w", "α": "a", "β": "b", "ε": "e", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p",
+    "τ": "t", "υ": "u", "χ": "x",
+}
+_CONFUSABLE_CHARS = re.compile("[" + "".join(_CONFUSABLES) + "]")
+
+_COMBINING = re.compile("[\u0300-\u036f]")
+
+# Leetspeak, only applied inside tokens that also contain a real letter ("1gn0re", "p@ss"),
+# so standalone numbers like "99" or "2024" are left as they are.
+_LEET = str.maketrans({"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "@": "a", "$": "s"})
+_LEET_CHARS = re.compile(r"[013457@$]")
+_LEET_TOKEN = re.compile(r"[a-z013457@$]*[a-z][a-z013457@$]*")
+# "@" between two words in an email shape ("admin@corp.com") stays, so the local part is still a word.
+_EMAIL_AT = re.compile(r"(?<=[^\W_])@(?=[^\W_][\w\-]*\.[^\W\d_]{2,})")
+
+# Regex syntax a pattern's literal characters are told apart from (see fold_pattern).
+_REGEX_META = set(".^$*+?{}[]|()")
+
+# "p.a.s.s.w.o.r.d" -> "password"; space-separated runs ("p a s s") are joined word by word.
+_DOTTED = re.compile(r"(?:[^\W_][.\-_*]){3,}[^\W_]")
+_SEPARATORS = re.compile(r"[.\-_*]")
+MIN_SPACED_RUN = 4
+
+_HEX_BLOB = re.compile(r"(?:[0-9a-fA-F]{2}){8,}")
+_BASE64_BLOB = re.compile(r"[A-Za-z0-9+/_-]{16,}={0,2}")
+
+
+def _fold_leet(word):
+    if "@" in word and _EMAIL_AT.search(word):
+        return "@".join(_fold_leet(part) for part in _EMAIL_AT.split(word))
+    return _LEET_TOKEN.sub(lambda m: m.group().translate(_LEET), word)
+
+
+def _fold_word(word):
+    if _DOTTED.fullmatch(word):
+        word = _SEPARATORS.sub("", word)
+    if _LEET_CHARS.search(word):
+        word = _fold_leet(word)
+    return word
+
+
+def _fold(text):
+    """Unicode, case, homoglyph, spacing and leetspeak folding (no decoding)."""
+    if not text.isascii():
+        text = _INVISIBLE.sub("", unicodedata.normalize("NFKC", text))
+    text = text.casefold()
+    if not text.isascii():
+        text = _CONFUSABLE_CHARS.sub(lambda m: _CONFUSABLES[m.group()], text)
+        # Strip accents: "ïgnöre" -> "ignore"
+        text = _COMBINING.sub("", unicodedata.normalize("NFD", text))
+
+    # Word by word: plain alphabetic words (most of any message) pass straight through,
+    # and splitting/joining also collapses whitespace runs.
+    out, run = [], []
+    for word in text.split():
+        if len(word) == 1 and word.isalnum():
+            run.append(word)
+            continue
+        if run:
+            _flush_run(out, run)
+        out.append(word if word.isalpha() else _fold_word(word))
+    if run:
+        _flush_run(out, run)
+    return " ".join(out)
+
+
+def _flush_run(out, run):
+    if len(run) >= MIN_SPACED_RUN:
+        out.append(_fold_word("".join(run)))
+    else:
+        out.extend(run)
+    run.clear()
+
+
+def _printable(raw):
+    try:
+        decoded = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    if len(decoded) < 4 or sum(ch.isprintable() or ch.isspace() for ch in decoded) < 0.9 * len(decoded):
+        return None
+    return decoded
+
+
+def decode_blobs(text):
+    """Readable payloads hidden in hex or base64 words of the message."""
+    found = []
+    for word in text.split():
+        if len(word) < 16:
+            continue
+        for m in _HEX_BLOB.finditer(word):
+            found.append(_printable(binascii.unhexlify(m.group())))
+        if not _HEX_BLOB.fullmatch(word):
+            for m in _BASE64_BLOB.finditer(word):
+                blob = m.group()
+                try:
+                    raw = base64.b64decode(blob + "=" * (-len(blob) % 4),
+                                           altchars=b"-_" if "-" in blob or "_" in blob else None)
+                except (binascii.Error, ValueError):
+                    continue
+                found.append(_printable(raw))
+        found = [d for d in found if d]
+        if len(found) >= MAX_DECODED:
+            break
+    return found[:MAX_DECODED]
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize(text, decode=DECODE_PROBE):
+    """
+    The form both matchers scan: folded text, followed by the folded contents
+    of any base64/hex payloads. Cached, so the decoy check and the pattern
+    rules share one normalization per message.
+    """
+    if not text:
+        return ""
+    folded = _fold(text)
+    if decode:
+        # Blobs are case-sensitive, so look for them before folding.
+        payloads = [_fold(p) for p in decode_blobs(_INVISIBLE.sub("", text))]
+        if payloads:
+            folded = "\n".join([folded] + payloads)
+    return folded
+
+
+def fold_term(term):
+    """Folds a decoy trigger the same way messages are folded, so the two still line up."""
+    return _fold(term)
+
+
+def fold_pattern(pattern):
+    """
+    Folds the literal characters of a detection regex the way messages are
+    folded ("h4ck3r" -> "hacker"), so rules written with digits still match
+    the normalized text. Escapes, classes and quantifiers are left as written.
+    """
+    pieces, run, i = [], "", 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\" and i + 1 < len(pattern):
+            nxt = pattern[i + 1]
+            if nxt.isalnum():
+                pieces += [_fold_literal(run), pattern[i:i + 2]]
+                run = ""
+            else:
+                run += nxt
+            i += 2
+        elif ch == "[" or ch == "{":
+            end = pattern.find("]" if ch == "[" else "}", i + 2 if ch == "[" else i) + 1 or len(pattern)
+            pieces += [_fold_literal(run), pattern[i:end]]
+            run = ""
+            i = end
+        elif ch in _REGEX_META:
+            pieces += [_fold_literal(run), ch]
+            run = ""
+            i += 1
+        else:
+            run += ch
+            i += 1
+    pieces.append(_fold_literal(run))
+    return "".join(pieces)
+
+
+def _fold_literal(run):
+    # Leet folding is one character for one, so a trailing quantifier still applies to the same character.
+    return re.escape(_fold_leet(run.lower()) if _LEET_CHARS.search(run) else run)
+
+
+def stats():
+    info = normalize.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": round(info.hits / lookups, 4) if lookups else 0.0,
+    }
@@ -0,0 +1,95 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# --- SAMPLING PROFILER ---
+# Off by default; toggled at runtime via /api/debug/profiler (or PROFILER=1 at startup).
+# While on, a daemon thread snapshots the event loop thread's stack every
+# interval. That costs the sampled thread nothing beyond the GIL hand-off, so it
+# is safe to switch on in production for a minute while something is slow.
+PROFILER_ENABLED = os.environ.get("PROFILER", "0") == "1"
+PROFILER_INTERVAL_MS = float(os.environ.get("PROFILER_INTERVAL_MS", "10"))
+MIN_INTERVAL_MS, MAX_INTERVAL_MS = 1, 1000  # faster sampling starves the loop of the GIL; slower shows nothing
+MAX_DEPTH = 64
+
+
+def clamp_interval(interval_ms):
+    """Keeps a sampling interval within MIN_INTERVAL_MS..MAX_INTERVAL_MS."""
+    return max(MIN_INTERVAL_MS, min(MAX_INTERVAL_MS, interval_ms))
+
+
+def _collapse(frame):
+    """One stack in the collapsed format flame graph tools read: root;...;leaf."""
+    parts = []
+    while frame is not None and len(parts) < MAX_DEPTH:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class _Run:
+    """One start()..stop() of the sampler; a thread still winding down only ever writes to its own run."""
+    __slots__ = ("stop", "stacks", "samples")
+
+    def __init__(self):
+        self.stop, self.stacks, self.samples = threading.Event(), Counter(), 0
+
+
+class SamplingProfiler:
+    """Aggregates sampled stacks of one thread (the event loop) into counts."""
+
+    def __init__(self, interval_ms=PROFILER_INTERVAL_MS):
+        self.interval_ms = clamp_interval(interval_ms)
+        self._run_state = _Run()
+        self._thread = None
+        self._target = None
+        self._started_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and not self._run_state.stop.is_set() and self._thread.is_alive()
+
+    def start(self, thread_id=None, interval_ms=None):
+        """
+        Starts sampling `thread_id` (default: the calling thread). Clears the
+        previous profile. `interval_ms` is clamped to MIN/MAX_INTERVAL_MS.
+        """
+        self.stop()
+        if interval_ms is not None:
+            self.interval_ms = clamp_interval(interval_ms)
+        self._target = thread_id or threading.get_ident()
+        self._run_state = _Run()
+        self._started_at = time.time()
+        self._thread = threading.Thread(target=self._run, args=(self._run_state, self._target, self.interval_ms / 1000),
+                                        name="sampling-profiler", daemon=True)
+        self._thread.start()
+        print(f"🔬 [PROFILER]: sampling every {self.interval_ms:g}ms")
+
+    def stop(self):
+        """Signals the sampler to exit without waiting for it (safe to call on the event loop)."""
+        if self._thread:
+            self._run_state.stop.set()
+            self._thread = None
+
+    @staticmethod
+    def _run(run, target, interval):
+        while not run.stop.wait(interval):
+            frame = sys._current_frames().get(target)
+            if frame is None or run.stop.is_set():
+                return  # target thread exited, or stopped while we were waking up
+            run.stacks[_collapse(frame)] += 1
+            run.samples += 1
+
+    def collapsed(self, limit=None):
+        """'stack count' lines, most frequent first (feed to flamegraph.pl or speedscope)."""
+        return "\n".join(f"{stack} {count}" for stack, count in self._run_state.stacks.copy().most_common(limit)) + "\n"
+
+    def stats(self):
+        return {"running": self.running, "interval_ms": self.interval_ms, "samples": self._run_state.samples,
+                "stacks": len(self._run_state.stacks), "started_at": self._started_at}
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,149 @@
+import asyncio
+import os
+
+# --- PROVIDER CONFIGURATION ---
+# LLM_PROVIDER=fake swaps in a local, network-free provider for load testing.
+LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "groq")
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "30"))                # seconds per upstream call
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "32"))  # in-flight calls per worker
+FAKE_LLM_LATENCY = float(os.environ.get("FAKE_LLM_LATENCY", "0.05"))    # seconds per fake completion
+
+
+class ProviderError(Exception):
+    """The upstream LLM call failed."""
+
+
+class ProviderTimeout(ProviderError):
+    """The upstream LLM call did not finish within LLM_TIMEOUT."""
+
+
+class LLMProvider:
+    """
+    Async chat-completion provider. Subclasses implement _complete/_stream;
+    this base class applies the per-worker concurrency limit to both.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY):
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def complete(self, messages, **params):
+        """Returns the full completion text."""
+        async with self._slots:
+            return await self._complete(messages, **params)
+
+    async def stream(self, messages, **params):
+        """Yields completion text chunks as they arrive."""
+        async with self._slots:
+            async for chunk in self._stream(messages, **params):
+                yield chunk
+
+    async def aclose(self):
+        pass
+
+    async def _complete(self, messages, **params):
+        raise NotImplementedError
+
+    async def _stream(self, messages, **params):
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+
+class GroqProvider(LLMProvider):
+    """
+    Groq's async client over one pooled HTTP connection set, reused across requests.
+    The client (and the groq/httpx imports) is created on the first call, so
+    importing the app stays cheap and works without GROQ_API_KEY.
+    """
+
+    def __init__(self, model, api_key=None, timeout=LLM_TIMEOUT, max_concurrency=LLM_MAX_CONCURRENCY):
+        super().__init__(max_concurrency)
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._http = None
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            if not self.api_key:
+                raise ProviderError("GROQ_API_KEY is not set")
+            import httpx
+            from groq import AsyncGroq
+
+            self._http = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+                timeout=self.timeout,
+            )
+            self._client = AsyncGroq(api_key=self.api_key, http_client=self._http, timeout=self.timeout,
+                                     max_retries=1)
+        return self._client
+
+    async def _complete(self, messages, **params):
+        import groq
+        try:
+            completion = await self._get_client().chat.completions.create(
+                model=self.model, messages=messages, stream=False, timeout=self.timeout, **params)
+        except groq.APITimeoutError as e:
+            raise ProviderTimeout(str(e)) from e
+        except groq.GroqError as e:
+            raise ProviderError(str(e)) from e
+        return completion.choices[0].message.content
+
+    async def _stream(self, messages, **params):
+        import groq
+        try:
+            stream = await self._get_client().chat.completions.create(
+                model=self.model, messages=messages, stream=True, timeout=self.timeout, **params)
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except groq.APITimeoutError as e:
+            raise ProviderTimeout(str(e)) from e
+        except groq.GroqError as e:
+            raise ProviderError(str(e)) from e
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = self._client = None
+
+
+class FakeProvider(LLMProvider):
+    """
+    Local stand-in for load tests: answers after `latency` seconds with an
+    echo of the prompt, never touching the network.
+    """
+
+    def __init__(self, model="fake-llm", latency=FAKE_LLM_LATENCY, max_concurrency=LLM_MAX_CONCURRENCY):
+        super().__init__(max_concurrency)
+        self.model = model
+        self.latency = latency
+        self.calls = 0
+
+    def _reply(self, messages):
+        prompt = messages[-1]["content"] if messages else ""
+        return f"[{self.model}] You said: {prompt[:200]}"
+
+    async def _complete(self, messages, **params):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _stream(self, messages, **params):
+        self.calls += 1
+        words = self._reply(messages).split(" ")
+        delay = self.latency / len(words) if self.latency else 0
+        for i, word in enumerate(words):
+            if delay:
+                await asyncio.sleep(delay)
+            yield word if i == 0 else " " + word
+
+
+def get_provider(model):
+    """Builds the provider selected by LLM_PROVIDER."""
+    if LLM_PROVIDER == "fake":
+        return FakeProvider(model)
+    return GroqProvider(model, api_key=os.environ.get("GROQ_API_KEY"))
@@ -0,0 +1,69 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- RATE LIMIT DEFAULTS ---
+# Used when an api_keys row leaves its limit NULL. Requests per minute; 0 disables
+# the limit. Burst defaults to the per-minute rate.
+DEFAULT_KEY_RATE = int(os.environ.get("RATE_LIMIT_KEY_PER_MIN", "600"))
+DEFAULT_USER_RATE = int(os.environ.get("RATE_LIMIT_USER_PER_MIN", "60"))
+# Requests without an API key share one bucket, so they are only limited when this is set.
+ANONYMOUS_RATE = int(os.environ.get("RATE_LIMIT_ANONYMOUS_PER_MIN", "0"))
+MAX_BUCKETS = 200_000  # idle buckets beyond this are dropped, least recently used first
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens, now):
+        self.tokens, self.updated = tokens, now
+
+
+class RateLimiter:
+    """
+    In-memory token buckets keyed by an arbitrary string (API key id, user email).
+    Each bucket refills continuously at `rate` tokens per minute up to `burst`;
+    a request takes one token or is told how long to wait for it.
+    """
+
+    def __init__(self, maxsize=MAX_BUCKETS):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    def acquire(self, key, rate, burst=None, cost=1):
+        """Returns 0 if allowed, else the seconds until `cost` tokens will be available."""
+        if not rate:
+            return 0
+        burst = burst or rate
+        per_second = rate / 60.0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(burst, now)
+                if len(self._buckets) > self.maxsize:
+                    self._buckets.popitem(last=False)
+            else:
+                bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * per_second)
+                bucket.updated = now
+                self._buckets.move_to_end(key)
+
+            if bucket.tokens >= cost:
+                bucket.tokens -= cost
+                self.allowed += 1
+                return 0
+            self.limited += 1
+            return (cost - bucket.tokens) / per_second
+
+    def stats(self):
+        return {"buckets": len(self._buckets), "allowed": self.allowed, "limited": self.limited}
+
+
+def retry_after_header(seconds):
+    """Retry-After takes whole seconds; round up so a client retrying on time gets a token."""
+    return str(max(1, math.ceil(seconds)))
@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+# --- RESPONSE CACHE CONFIGURATION ---
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "600"))                    # seconds
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+def normalize_prompt(prompt: str):
+    """Folds case and whitespace so trivially different prompts share an entry."""
+    return " ".join(prompt.lower().split())
+
+
+def cache_key(prompt, model, system_prompt, params):
+    raw = json.dumps([normalize_prompt(prompt), model, system_prompt, params], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    LLM replies for clean prompts, keyed on the normalized prompt plus model
+    and sampling parameters. Entries expire after `ttl` seconds and the cache
+    evicts least-recently-used replies to stay under `max_bytes`.
+    Concurrent misses for the same key share a single upstream call.
+    """
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (expires_at, reply, size)
+        self._bytes = 0
+        self._inflight = {}         # key -> Future of the reply being fetched
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._drop(key)
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, reply):
+        if not isinstance(reply, str) or not reply:
+            return  # nothing worth replaying (e.g. a provider that returned no content)
+        size = len(reply.encode())
+        if size > self.max_bytes:
+            return
+        if key in self._data:
+            self._drop(key)
+        self._data[key] = (time.monotonic() + self.ttl, reply, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            self._drop(next(iter(self._data)))
+            self.evictions += 1
+
+    def _drop(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    async def get_or_fetch(self, key, fetch):
+        """
+        Returns (reply, from_cache). from_cache is True for cache hits and for
+        requests that piggy-backed on another request's in-flight fetch. If
+        that fetch fails or is cancelled, the waiting requests fetch for
+        themselves instead of inheriting its error.
+        """
+        reply = self.get(key)
+        if reply is not None:
+            self.hits += 1
+            return reply, True
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            try:
+                reply = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # this request itself was cancelled
+            except Exception:
+                pass
+            else:
+                self.coalesced += 1
+                return reply, True
+            self.misses += 1
+            reply = await fetch()
+            self.set(key, reply)
+            return reply, False
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            reply = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self.set(key, reply)
+        future.set_result(reply)
+        return reply, False
+
+    def clear(self):
+        self._data.clear()
+        self._bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "size": len(self._data),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,206 @@
+import json
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from archive import read_archive
+from scan import scan_text, pool_context, SCAN_WORKERS
+
+# --- RETRO-HUNT CONFIGURATION ---
+# Rescans historical logs.message with the current rule snapshot (decoys + PATTERNS
+# + rules file) and records which past messages it flags. Meant for manage.py,
+# not the request path: it keeps every worker process busy until it is done.
+HUNT_CHUNK_ROWS = int(os.environ.get("RETRO_HUNT_CHUNK_ROWS", "2000"))  # rows per read, task and checkpoint
+HUNT_WORKERS = int(os.environ.get("RETRO_HUNT_WORKERS", str(os.cpu_count() or SCAN_WORKERS)))
+PROGRESS_INTERVAL = 5.0  # seconds between progress lines
+PREVIEW_CHARS = 200      # message kept with each hit (archived months can expire)
+
+# Each worker process receives the matcher/engine once (pool initializer) rather than with every task.
+_worker_rules = None
+
+
+def _init_worker(matcher, engine):
+    global _worker_rules
+    _worker_rules = (matcher, engine)
+
+
+def hunt_chunk(rows, rules=None):
+    """Scans (id, message, threat_categories, user_email, timestamp) rows; returns only the hits."""
+    matcher, engine = rules or _worker_rules
+    hits = []
+    for log_id, message, logged, user_email, timestamp in rows:
+        verdict = scan_text(matcher, engine, message or "")
+        if not verdict["is_attack"]:
+            continue
+        try:
+            known = set(json.loads(logged or "[]"))
+        except (TypeError, ValueError):  # a malformed row counts as flagged with nothing
+            known = set()
+        hits.append((log_id, verdict, [c for c in verdict["categories"] if c not in known],
+                     user_email, timestamp, (message or "")[:PREVIEW_CHARS]))
+    return hits
+
+
+class RetroHunt:
+    """
+    One hunt over logs (and optionally the monthly archives). Rows are read in
+    rowid order, the order they sit on disk, up to the last rowid that existed
+    when the hunt started. A bounded window of chunks is in flight on the
+    process pool. Results are committed in read order, each together with its
+    checkpoint, so `resume` continues exactly after the last committed chunk.
+    """
+
+    def __init__(self, database, rules, workers=HUNT_WORKERS, chunk_rows=HUNT_CHUNK_ROWS, compactor=None):
+        self.db = database
+        self.rules = rules
+        self.workers = workers
+        self.chunk_rows = chunk_rows
+        self.compactor = compactor  # archive.Compactor, to include archived months
+        self.hunt = None
+
+    # --- HUNT RECORDS ---
+    def create(self, include_archives=False):
+        hunt_id = str(uuid.uuid4())
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            conn.execute("""INSERT INTO retro_hunts (id, rules_version, status, include_archives, max_rowid,
+                                last_rowid, scanned, hits, new_hits, total_rows, started_at, updated_at)
+                            VALUES (?, ?, 'running', ?, (SELECT COALESCE(MAX(rowid), 0) FROM logs), 0, 0, 0, 0,
+                                    ?, ?, ?)""",
+                         (hunt_id, self.rules.version, int(include_archives),
+                          self.db.count_logs() + (self._archived_rows() if include_archives else 0), now, now))
+        self.hunt = self.db.query("SELECT * FROM retro_hunts WHERE id = ?", (hunt_id,), one=True)
+        return self.hunt
+
+    def load(self, hunt_id):
+        hunt = self.db.query("SELECT * FROM retro_hunts WHERE id = ?", (hunt_id,), one=True)
+        if not hunt:
+            raise ValueError(f"no retro-hunt {hunt_id}")
+        if hunt["rules_version"] != self.rules.version:
+            # Resuming would mix two rule sets into one result set.
+            raise ValueError(f"rules changed since hunt {hunt_id} started "
+                             f"({hunt['rules_version']} -> {self.rules.version}); start a new hunt")
+        self.hunt = hunt
+        return hunt
+
+    def _archived_rows(self):
+        return self.db.scalar("SELECT COALESCE(SUM(rows), 0) FROM log_archives WHERE table_name = 'logs'")
+
+    # --- RUN ---
+    def run(self):
+        """Scans everything after the hunt's checkpoint. Returns the finished hunt row."""
+        self._set_status("running")
+        hunt = self.hunt
+        self._progress_at = self._started = time.perf_counter()
+        self._scanned_here = 0
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context(), initializer=_init_worker,
+                                   initargs=(self.rules.matcher, self.rules.engine)) if self.workers > 1 else None
+        try:
+            self._scan(pool, self._live_chunks(hunt["last_rowid"], hunt["max_rowid"]))
+            if hunt["include_archives"] and self.compactor:
+                self._scan(pool, self._archive_chunks(hunt["archive_month"], hunt["archive_offset"]))
+        except BaseException as e:
+            self._set_status("interrupted" if isinstance(e, KeyboardInterrupt) else "failed", str(e) or None)
+            raise
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+        self._set_status("done")
+        return self.hunt
+
+    def _live_chunks(self, after, max_rowid):
+        while True:
+            rows = self.db.query("SELECT rowid, id, message, threat_categories, user_email, timestamp FROM logs "
+                                 "WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?",
+                                 (after, max_rowid, self.chunk_rows))
+            if not rows:
+                return
+            after = rows[-1]["rowid"]
+            yield [(r["id"], r["message"], r["threat_categories"], r["user_email"], r["timestamp"]) for r in rows], \
+                {"last_rowid": after}
+
+    def _archive_chunks(self, month, offset):
+        # Checkpoint: the archive month in progress and how many of its rows are committed.
+        for entry in self.compactor.archives("logs"):
+            if month and entry["month"] < month:
+                continue
+            skip = offset if entry["month"] == month else 0
+            rows, done = [], 0
+            for row in read_archive(os.path.join(self.compactor.directory, entry["file"])):
+                done += 1
+                if done <= skip:
+                    continue
+                rows.append((row["id"], row.get("message"), row.get("threat_categories"),
+                             row.get("user_email"), row.get("timestamp")))
+                if len(rows) >= self.chunk_rows:
+                    yield rows, {"archive_month": entry["month"], "archive_offset": done}
+                    rows = []
+            if rows:
+                yield rows, {"archive_month": entry["month"], "archive_offset": done}
+
+    def _scan(self, pool, chunks):
+        if pool is None:
+            for rows, checkpoint in chunks:
+                self._commit(rows, hunt_chunk(rows, (self.rules.matcher, self.rules.engine)), checkpoint)
+            return
+        window = deque()  # (future, rows, checkpoint) in read order
+        for rows, checkpoint in chunks:
+            window.append((pool.submit(hunt_chunk, rows), rows, checkpoint))
+            if len(window) >= self.workers * 2:
+                future, done_rows, done_checkpoint = window.popleft()
+                self._commit(done_rows, future.result(), done_checkpoint)
+        while window:
+            future, done_rows, done_checkpoint = window.popleft()
+            self._commit(done_rows, future.result(), done_checkpoint)
+
+    def _commit(self, rows, hits, checkpoint):
+        """Stores one chunk's hits and advances the checkpoint in the same transaction."""
+        hunt_id = self.hunt["id"]
+        new_hits = sum(1 for hit in hits if hit[2])
+        with self.db.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO retro_hunt_hits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(hunt_id, log_id, v["risk_score"], json.dumps(v["categories"]), json.dumps(new), v["decoy"],
+                  json.dumps(v["detections"]), user_email, timestamp, preview, datetime.now().isoformat())
+                 for log_id, v, new, user_email, timestamp, preview in hits])
+            sets = ", ".join(f"{k} = ?" for k in checkpoint)
+            conn.execute(f"UPDATE retro_hunts SET scanned = scanned + ?, hits = hits + ?, new_hits = new_hits + ?, "
+                         f"updated_at = ?{', ' + sets if sets else ''} WHERE id = ?",
+                         (len(rows), len(hits), new_hits, datetime.now().isoformat(), *checkpoint.values(), hunt_id))
+        self._scanned_here += len(rows)
+        now = time.perf_counter()
+        if now - self._progress_at >= PROGRESS_INTERVAL:
+            self._progress_at = now
+            self.hunt = self.db.query("SELECT * FROM retro_hunts WHERE id = ?", (hunt_id,), one=True)
+            rate = self._scanned_here / (now - self._started)
+            left = max(0, self.hunt["total_rows"] - self.hunt["scanned"])
+            print(f"🔎 [RETRO-HUNT]: {self.hunt['scanned']}/{self.hunt['total_rows']} rows, "
+                  f"{self.hunt['hits']} hits ({self.hunt['new_hits']} new), {rate:,.0f} rows/s, "
+                  f"~{left / rate if rate else 0:.0f}s left")
+
+    def _set_status(self, status, error=None):
+        now = datetime.now().isoformat()
+        self.db.execute("UPDATE retro_hunts SET status = ?, error = ?, updated_at = ?, finished_at = ? WHERE id = ?",
+                        (status, error, now, now if status == "done" else None, self.hunt["id"]))
+        self.hunt = self.db.query("SELECT * FROM retro_hunts WHERE id = ?", (self.hunt["id"],), one=True)
+
+
+# --- RESULTS ---
+def list_hunts(database, limit=20):
+    return database.query("SELECT * FROM retro_hunts ORDER BY started_at DESC LIMIT ?", (limit,))
+
+
+def hunt_hits(database, hunt_id, only_new=False, limit=100, offset=0):
+    """A hunt's hits, highest risk first; only_new keeps messages whose categories were missed at the time."""
+    sql = "SELECT * FROM retro_hunt_hits WHERE hunt_id = ?"
+    if only_new:
+        sql += " AND new_categories != '[]'"
+    rows = database.query(sql + " ORDER BY risk_score DESC, timestamp DESC LIMIT ? OFFSET ?",
+                          (hunt_id, limit, offset))
+    for row in rows:
+        for field in ("categories", "new_categories", "detections"):
+            row[field] = json.loads(row[field] or "[]")
+    return rows
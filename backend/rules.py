@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from detection import PATTERNS, DetectionEngine
+from matcher import TriggerMatcher
+
+# --- RULE REGISTRY CONFIGURATION ---
+# Optional JSON file of extra categories, shaped like PATTERNS: {"name": {"patterns": [...], "risk": 80, "desc": "..."}}.
+# Its categories are added to (or replace) the built-in ones.
+# Absolute, like DB_PATH, so every worker and manage.py read the same file whatever their cwd.
+RULES_FILE = os.path.abspath(os.environ.get("RULES_FILE")
+                             or os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json"))
+RULES_POLL_INTERVAL = float(os.environ.get("RULES_POLL_INTERVAL", "2"))  # seconds between rules-file checks
+
+# One immutable, fully compiled rule set. version is a content hash, so the
+# same decoys + patterns always carry the same version (across restarts and workers).
+RuleSnapshot = namedtuple("RuleSnapshot", ["version", "matcher", "engine", "decoys", "patterns", "built_at"])
+
+
+class RulesFileError(ValueError):
+    """The rules file is not valid JSON in the PATTERNS shape."""
+
+
+def load_rules_file(path):
+    """Reads the optional rules file; returns {} when it does not exist."""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            rules = json.load(f)
+    except json.JSONDecodeError as e:
+        raise RulesFileError(f"{path}: {e}") from e
+    if not isinstance(rules, dict):
+        raise RulesFileError(f"{path}: expected an object of categories")
+    for category, data in rules.items():
+        if not isinstance(data, dict) or not isinstance(data.get("patterns"), list) \
+                or not isinstance(data.get("risk"), int):
+            raise RulesFileError(f"{path}: category '{category}' needs a 'patterns' list and an integer 'risk'")
+    return rules
+
+
+class RuleRegistry:
+    """
+    Holds the current RuleSnapshot built from PATTERNS, the rules file and the
+    active decoys. Readers take `registry.current` once per request and use
+    that snapshot throughout. Rebuilds compile a complete new snapshot off the
+    event loop and then swap a single reference, so a request never sees a
+    half-built rule set.
+    """
+
+    def __init__(self, database, rules_file=RULES_FILE, poll_interval=RULES_POLL_INTERVAL):
+        self.db = database
+        self.rules_file = rules_file
+        self.poll_interval = poll_interval
+        self._current = None
+        self._build_lock = threading.Lock()
+        self._rebuild_task = None
+        self._dirty = False
+        self._watch_task = None
+        self._file_stamp = None
+        self._file_rules = {}
+
+    @property
+    def current(self):
+        return self._current
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.rules_file)
+            return st.st_mtime_ns, st.st_size
+        except (OSError, TypeError):
+            return None
+
+    def rebuild(self):
+        """Builds a snapshot from the current sources and swaps it in (blocking). Returns the current snapshot."""
+        with self._build_lock:
+            stamp = self._stamp()
+            file_rules, engine = self._file_rules, None
+            try:
+                candidate = load_rules_file(self.rules_file)
+                if candidate != self._file_rules:
+                    # Compile before accepting: one bad regex must not replace the last good rules.
+                    engine = DetectionEngine({**PATTERNS, **candidate})
+                    file_rules = candidate
+            except (RulesFileError, re.error, TypeError) as e:
+                # A broken edit must not block decoy changes: keep the last good file contents.
+                print(f"❌ Ignoring rules file, using its last valid contents: {e}")
+            patterns = dict(PATTERNS)
+            patterns.update(file_rules)
+            decoys = self.db.query("SELECT * FROM decoys WHERE is_active = 1")
+            self._file_stamp = stamp
+
+            raw = json.dumps([patterns, decoys], sort_keys=True, default=str)
+            version = hashlib.sha256(raw.encode()).hexdigest()[:12]
+            if self._current and self._current.version == version:
+                self._file_rules = file_rules
+                return self._current
+
+            snapshot = RuleSnapshot(
+                version=version,
+                matcher=TriggerMatcher(decoys),
+                engine=engine or DetectionEngine(patterns),
+                decoys=len(decoys),
+                patterns=sum(len(p["patterns"]) for p in patterns.values()),
+                built_at=datetime.now().isoformat(),
+            )
+            self._file_rules, self._current = file_rules, snapshot
+            print(f"📐 [RULES]: snapshot {version} ({len(decoys)} decoys, {self._current.patterns} patterns)")
+            return self._current
+
+    def request_rebuild(self):
+        """
+        Schedules a background rebuild and returns immediately. Changes that
+        arrive while one is running are folded into a single follow-up build.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.rebuild()  # no event loop (scripts): just build inline
+            return
+        if self._rebuild_task and not self._rebuild_task.done():
+            self._dirty = True
+            return
+        self._rebuild_task = asyncio.create_task(self._rebuild_loop())
+
+    async def _rebuild_loop(self):
+        while True:
+            self._dirty = False
+            try:
+                await asyncio.to_thread(self.rebuild)
+            except Exception as e:
+                version = self._current.version if self._current else None
+                print(f"❌ Rule rebuild failed, keeping snapshot {version}: {e}")
+            if not self._dirty:
+                return
+
+    async def wait(self):
+        """Waits for any scheduled rebuild to finish."""
+        while self._rebuild_task and not self._rebuild_task.done():
+            await self._rebuild_task
+
+    # --- RULES FILE WATCHER ---
+    async def start(self):
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+        await self.wait()
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if self._stamp() != self._file_stamp:
+                self._file_stamp = self._stamp()  # don't re-queue the same change every poll
+                self.request_rebuild()
+
+    def stats(self):
+        s = self._current
+        return {"version": s.version, "decoys": s.decoys, "patterns": s.patterns, "built_at": s.built_at} if s else None
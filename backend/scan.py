@@ -0,0 +1,106 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from normalize import normalize
+
+# --- BATCH SCAN CONFIGURATION ---
+MAX_BATCH = 10000           # texts accepted per /api/scan/batch call
+PARALLEL_THRESHOLD = 512    # below this, scanning inline beats shipping work to other processes
+CHUNK_SIZE = 256            # texts per process-pool task
+SCAN_WORKERS = int(os.environ.get("SCAN_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+DECOY_RISK = 90  # same risk chat_proxy assigns to a decoy hit
+
+# Workers start from a clean interpreter (no forked event loop, sockets or DB handles)
+# and receive the rule snapshot once, through the pool initializer, not with every chunk.
+_POOL_CONTEXT = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+_worker_rules = None  # (version, matcher, engine)
+
+
+def pool_context():
+    """multiprocessing context for detection worker pools (batch scans, retro-hunts)."""
+    return multiprocessing.get_context(_POOL_CONTEXT)
+
+
+def scan_text(matcher, engine, text):
+    """Detection stage only (decoy triggers + PATTERNS rules) for one text."""
+    view = normalize(text)
+    hit = matcher.first_match(view)
+    detections = engine.scan(view)
+
+    categories, risk = [], 0
+    if hit:
+        categories.append(hit.decoy["category"])
+        risk = DECOY_RISK
+    for d in detections:
+        if d.category not in categories:
+            categories.append(d.category)
+        risk = max(risk, d.risk)
+
+    return {
+        "is_attack": bool(categories),
+        "risk_score": risk,
+        "categories": categories,
+        "decoy": hit.decoy["title"] if hit else None,
+        "detections": ([{"trigger": hit.trigger, "offset": hit.start}] if hit else [])
+                      + [{"pattern": d.pattern, "span": list(d.span)} for d in detections],
+    }
+
+
+def scan_chunk(matcher, engine, texts):
+    return [scan_text(matcher, engine, t) for t in texts]
+
+
+def _init_worker(version, matcher, engine):
+    global _worker_rules
+    _worker_rules = (version, matcher, engine)
+
+
+def _scan_worker_chunk(version, texts):
+    """Process-pool task: scans a chunk with the snapshot this worker was started with."""
+    worker_version, matcher, engine = _worker_rules
+    if worker_version != version:
+        raise RuntimeError(f"scan worker holds rules {worker_version}, chunk needs {version}")
+    return scan_chunk(matcher, engine, texts)
+
+
+class BatchScanner:
+    """Runs the detection stage over many texts, fanning large batches out to a process pool."""
+
+    def __init__(self, workers=SCAN_WORKERS):
+        self.workers = workers
+        self._pool = None
+        self._pool_version = None
+
+    def _get_pool(self, rules):
+        """The pool whose workers hold `rules`; a new snapshot version gets a new pool."""
+        if self._pool is not None and self._pool_version != rules.version:
+            # Chunks already queued on the old pool still finish on it.
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=pool_context(),
+                                             initializer=_init_worker,
+                                             initargs=(rules.version, rules.matcher, rules.engine))
+            self._pool_version = rules.version
+        return self._pool
+
+    async def scan(self, rules, texts):
+        """Scans texts against one RuleSnapshot."""
+        if len(texts) < PARALLEL_THRESHOLD or self.workers <= 1:
+            return await asyncio.to_thread(scan_chunk, rules.matcher, rules.engine, texts)
+
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool(rules)
+        chunks = [texts[i:i + CHUNK_SIZE] for i in range(0, len(texts), CHUNK_SIZE)]
+        results = await asyncio.gather(*[
+            loop.run_in_executor(pool, _scan_worker_chunk, rules.version, chunk) for chunk in chunks])
+        return [verdict for chunk in results for verdict in chunk]
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._pool_version = None
@@ -0,0 +1,41 @@
+"""
+Production entry point: several uvicorn worker processes sharing one SQLite database.
+
+    python serve.py [--workers 4] [--host 0.0.0.0] [--port 8000] [--db /var/lib/honeyprompt/honeyprompt.db]
+
+Per-worker caches and rule snapshots stay in sync through the change_versions
+counters (see invalidation.py); a change made in one worker reaches the others
+within INVALIDATION_POLL_INTERVAL seconds.
+"""
+import argparse
+import os
+
+import uvicorn
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("HONEYPROMPT_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--db", help="SQLite database path (default: HONEYPROMPT_DB_PATH or backend/honeyprompt.db)")
+    args = parser.parse_args()
+
+    if args.db:
+        # Workers are fresh interpreters that read the path from the environment.
+        os.environ["HONEYPROMPT_DB_PATH"] = os.path.abspath(args.db)
+
+    # Migrate and seed once, before any worker exists, so workers only find a current schema.
+    from database import db
+    db.init_db()
+    print(f"🗄️  [SERVE]: database {db.path}")
+    db.close()
+
+    uvicorn.run("main:app", app_dir=BACKEND_DIR, host=args.host, port=args.port, workers=args.workers,
+                proxy_headers=True)
+
+
+if __name__ == "__main__":
+    main()
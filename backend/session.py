@@ -0,0 +1,90 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# --- SESSION SCORING CONFIGURATION ---
+HALF_LIFE = float(os.environ.get("RISK_HALF_LIFE", "600"))             # seconds for a score to halve
+ESCALATE_SCORE = float(os.environ.get("RISK_ESCALATE_SCORE", "200"))   # session score that raises an escalation
+AUTO_BLOCK_SCORE = float(os.environ.get("RISK_AUTO_BLOCK_SCORE", "400"))  # user score that auto-blocks
+MAX_SESSIONS = 200_000
+SESSION_TTL = 24 * 60 * 60       # idle sessions are forgotten after a day
+
+# What observe() decided for one message. User scores (and auto-blocks) are kept
+# in the shared risk_profiles table instead, see Database._update_risk_profiles.
+Verdict = namedtuple("Verdict", ["session_score", "escalate"])
+
+
+class _Session:
+    __slots__ = ("score", "updated", "escalated")
+
+    def __init__(self):
+        self.score, self.updated, self.escalated = 0.0, 0.0, False
+
+
+class _BoundedTable:
+    """OrderedDict kept in last-activity order: LRU eviction at capacity, TTL eviction from the idle end."""
+
+    def __init__(self, factory, maxsize, ttl):
+        self.factory, self.maxsize, self.ttl = factory, maxsize, ttl
+        self.data = OrderedDict()
+
+    def touch(self, key, now):
+        """Returns (entry, created) and marks the entry most recently active."""
+        entry = self.data.get(key)
+        created = entry is None
+        if created:
+            entry = self.data[key] = self.factory()
+            entry.updated = now
+        else:
+            self.data.move_to_end(key)
+        self._evict(now)
+        return entry, created
+
+    def _evict(self, now):
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+        while self.data:
+            oldest = next(iter(self.data.values()))
+            if now - oldest.updated <= self.ttl:
+                break
+            self.data.popitem(last=False)
+
+
+def decay(score, since, now, half_life=HALF_LIFE):
+    """`score` as it stood at `since`, faded to `now` (both epoch seconds)."""
+    if score <= 0 or now <= since:
+        return score
+    return score * math.pow(0.5, (now - since) / half_life)
+
+
+class RiskTracker:
+    """
+    Streaming per-session risk. Each message adds its risk to an exponentially
+    decaying score (O(1) per update), so bursts of attacks escalate while old
+    activity fades. State is bounded by LRU + idle TTL and lives in this
+    process; per-user scores are shared through the database.
+    """
+
+    def __init__(self, half_life=HALF_LIFE, escalate_score=ESCALATE_SCORE,
+                 max_sessions=MAX_SESSIONS, session_ttl=SESSION_TTL):
+        self.half_life = half_life
+        self.escalate_score = escalate_score
+        self._sessions = _BoundedTable(_Session, max_sessions, session_ttl)
+        self._lock = threading.Lock()
+
+    def observe(self, user_email, session_id, risk, at=None):
+        """Records one message and returns the resulting Verdict."""
+        now = time.time() if at is None else at
+        with self._lock:
+            session, _ = self._sessions.touch((user_email, session_id), now)
+            session.score = decay(session.score, session.updated, now, self.half_life) + risk
+            session.updated = now
+
+            escalate = session.score >= self.escalate_score and not session.escalated
+            session.escalated = session.escalated or escalate
+            return Verdict(round(session.score, 1), escalate)
+
+    def stats(self):
+        return {"sessions": len(self._sessions.data)}
@@ -0,0 +1,444 @@
+import hashlib
+import json
+import os
+import threading
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+
+from normalize import normalize
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+# --- SIMILARITY DETECTOR CONFIGURATION ---
+SIMILARITY_ENABLED = os.environ.get("SIMILARITY_DETECTOR", "0") == "1"
+
+np = None
+if SIMILARITY_ENABLED:  # NumPy takes ~100ms to import, so only pay for it when the detector is on
+    try:
+        import numpy as np
+    except ImportError:  # optional dependency: the detector stays off without it
+        np = None
+SIMILARITY_DIR = os.environ.get("SIMILARITY_DIR", "vector_index")
+SIMILARITY_DIM = int(os.environ.get("SIMILARITY_DIM", "256"))                  # hashed feature slots
+SIMILARITY_THRESHOLD = float(os.environ.get("SIMILARITY_THRESHOLD", "0.8"))   # cosine score that flags a prompt
+SIMILARITY_MIN_RISK = int(os.environ.get("SIMILARITY_MIN_RISK", "70"))        # logs at/above this are learned
+SIMILAR_CATEGORY = "similar_attack"
+QUERY_CHUNK = 64  # prompts compared per matrix product in check_many()
+
+INDEX_VERSION = 2
+HEADER_FILE = "header.json"
+VECTORS_FILE = "vectors.f32"    # float32 rows, append-only
+META_FILE = "meta.ndjson"       # one JSON line per row
+DIGESTS_FILE = "digests.u64"    # one hash of the normalized prompt per row (duplicate guard)
+LISTS_FILE = "lists.i32"        # coarse cluster of each row, once the index is partitioned
+CENTROIDS_FILE = "centroids.f32"
+IVF_FILE = "ivf.json"
+LOCK_FILE = "index.lock"
+
+# Coarse partitioning (IVF): past IVF_MIN_ROWS, rows are clustered and a query
+# only scans the rows of its IVF_PROBES nearest clusters instead of every row.
+IVF_MIN_ROWS = 20_000
+IVF_PROBES = int(os.environ.get("SIMILARITY_PROBES", "8"))
+IVF_RETRAIN_GROWTH = 4   # re-cluster once the index has grown this many times over
+IVF_SAMPLE = 20_000      # rows the clustering is trained on
+
+# Nearest stored attack for a prompt: cosine score plus what was stored with it.
+SimilarMatch = namedtuple("SimilarMatch", ["score", "log_id", "categories", "risk", "preview"])
+
+
+class HashingVectorizer:
+    """
+    Embeds text as signed, hashed word uni/bi-grams plus character 4-grams,
+    L2-normalized. Stateless, so vectors stay comparable across restarts.
+    """
+
+    def __init__(self, dim=SIMILARITY_DIM):
+        self.dim = dim
+
+    def _features(self, text):
+        words = text.split()
+        padded = f" {text} "
+        return (words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+                + [padded[i:i + 4] for i in range(len(padded) - 3)])
+
+    def transform(self, text):
+        """text is expected to be normalize()d already."""
+        hashes = np.fromiter((zlib.crc32(f.encode()) for f in self._features(text)), dtype=np.uint32)
+        vec = np.zeros(self.dim, dtype=np.float32)
+        if hashes.size:
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            vec = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim).astype(np.float32)
+            norm = np.linalg.norm(vec)
+            if norm:
+                vec /= norm
+        return vec
+
+
+def _kmeans(sample, k, iters=10, seed=0):
+    """Spherical k-means: unit-length centroids, assignment by highest dot product."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iters):
+        assign = (sample @ centroids.T).argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        empty = np.bincount(assign, minlength=k) == 0
+        sums[empty] = centroids[empty]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-9)
+    return centroids.astype(np.float32)
+
+
+def _assign(vectors, centroids, chunk=8192):
+    return np.concatenate([(vectors[i:i + chunk] @ centroids.T).argmax(axis=1).astype(np.int32)
+                           for i in range(0, len(vectors), chunk)] or [np.zeros(0, dtype=np.int32)])
+
+
+def _cluster_lists(assign, k):
+    """Inverted lists: for each cluster, the ids of its rows in ascending order."""
+    order = np.argsort(assign, kind="stable")
+    return np.split(order, np.cumsum(np.bincount(assign, minlength=k))[:-1])
+
+
+def _extend_lists(lists, clusters, first_row):
+    """New inverted lists with rows first_row.. (assigned to `clusters`) appended; `lists` is left as is."""
+    lists = list(lists)
+    rows = np.arange(first_row, first_row + len(clusters))
+    for c in np.unique(clusters):
+        lists[c] = np.concatenate([lists[c], rows[clusters == c]])
+    return lists
+
+
+class VectorIndex:
+    """
+    Append-only, memory-mapped store of attack vectors (FAISS IndexIVFFlat-style).
+    Opening maps vectors.f32 instead of loading it and adds are appended to
+    every file. Small indexes are scanned in full with one matrix product;
+    large ones are clustered, and a query only scans its nearest clusters.
+    """
+
+    def __init__(self, directory=SIMILARITY_DIR, dim=SIMILARITY_DIM, probes=IVF_PROBES):
+        self.directory = directory
+        self.dim = dim
+        self.probes = probes
+        self._lock = threading.Lock()
+        # (mapped vectors, cluster per row, centroids, row ids per cluster; None until trained), swapped as one reference
+        self._state = (np.zeros((0, dim), dtype=np.float32), None, None, None)
+        self._meta = []          # raw meta lines, parsed only for the rows a query returns
+        self._digests = set()
+        self._trained_rows = 0
+        self._trainer = None  # background clustering thread
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _rows_in(self, name, itemsize):
+        path = self._path(name)
+        return os.path.getsize(path) // itemsize if os.path.exists(path) else 0
+
+    def __len__(self):
+        return len(self._state[0])
+
+    @contextmanager
+    def _file_lock(self):
+        """Serializes index writers across worker processes (no-op where flock is unavailable)."""
+        if fcntl is None:
+            yield
+            return
+        with open(self._path(LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def open(self):
+        """Maps an existing index (or starts an empty one; a dim/version mismatch starts over)."""
+        os.makedirs(self.directory, exist_ok=True)
+        header = {"version": INDEX_VERSION, "dim": self.dim}
+        with self._lock, self._file_lock():
+            try:
+                with open(self._path(HEADER_FILE)) as f:
+                    if json.load(f) != header:
+                        raise ValueError("index built with other settings")
+            except (FileNotFoundError, ValueError, json.JSONDecodeError):
+                for name in (VECTORS_FILE, META_FILE, DIGESTS_FILE, LISTS_FILE, CENTROIDS_FILE, IVF_FILE):
+                    if os.path.exists(self._path(name)):
+                        os.remove(self._path(name))
+                with open(self._path(HEADER_FILE), "w") as f:
+                    json.dump(header, f)
+            self._load()
+
+    def refresh(self):
+        """Picks up rows (or a re-clustering) another worker process wrote since we last loaded."""
+        with self._lock, self._file_lock():
+            if self._stale():
+                self._load()
+
+    def _disk_trained_rows(self):
+        try:
+            with open(self._path(IVF_FILE)) as f:
+                return json.load(f)["trained_rows"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return 0
+
+    def _stale(self):
+        return (self._rows_in(VECTORS_FILE, self.dim * 4) != len(self)
+                or self._disk_trained_rows() != self._trained_rows)
+
+    def _load(self):
+        """(Re)reads every file. Caller holds both locks."""
+        meta = []
+        if os.path.exists(self._path(META_FILE)):
+            with open(self._path(META_FILE), "rb") as f:
+                meta = [line for line in f if line.endswith(b"\n")]
+
+        # After a crash mid-append, keep only the rows every file has.
+        count = min(self._rows_in(VECTORS_FILE, self.dim * 4), self._rows_in(DIGESTS_FILE, 8), len(meta))
+        self._truncate(VECTORS_FILE, count * self.dim * 4)
+        self._truncate(DIGESTS_FILE, count * 8)
+        if len(meta) > count or not os.path.exists(self._path(META_FILE)):
+            with open(self._path(META_FILE), "wb") as f:
+                f.writelines(meta[:count])
+        self._meta = meta[:count]
+        self._digests = set(np.fromfile(self._path(DIGESTS_FILE), dtype=np.uint64).tolist())
+        vectors = self._map(count)
+
+        centroids, assign, lists = None, None, None
+        self._trained_rows = self._disk_trained_rows()
+        if self._trained_rows:
+            centroids = np.fromfile(self._path(CENTROIDS_FILE), dtype=np.float32).reshape(-1, self.dim)
+            assign = np.fromfile(self._path(LISTS_FILE), dtype=np.int32)[:count]
+            if len(assign) < count:  # rows whose cluster was never written
+                assign = np.concatenate([assign, _assign(vectors[len(assign):], centroids)])
+                assign.tofile(self._path(LISTS_FILE))
+            lists = _cluster_lists(assign, len(centroids))
+        self._state = (vectors, assign, centroids, lists)
+        self._maybe_train()
+
+    def _truncate(self, name, size):
+        path = self._path(name)
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        elif os.path.getsize(path) > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+    def _map(self, count):
+        if not count:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r", shape=(count, self.dim))
+
+    def add(self, vectors, metas, digests):
+        """Appends rows, skipping prompts already stored (by digest). Returns how many were added."""
+        with self._lock, self._file_lock():
+            if self._stale():  # another worker appended since our last load
+                self._load()
+            keep, new = [], set()
+            for i, digest in enumerate(digests):
+                if digest not in self._digests and digest not in new:
+                    new.add(digest)
+                    keep.append(i)
+            if not keep:
+                return 0
+            block = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32)[keep])
+            lines = [(json.dumps(metas[i]) + "\n").encode() for i in keep]
+            _, assign, centroids, lists = self._state
+
+            with open(self._path(VECTORS_FILE), "ab") as f:
+                f.write(block.tobytes())
+            with open(self._path(DIGESTS_FILE), "ab") as f:
+                f.write(np.asarray([digests[i] for i in keep], dtype=np.uint64).tobytes())
+            with open(self._path(META_FILE), "ab") as f:
+                f.writelines(lines)
+            if centroids is not None:
+                clusters = _assign(block, centroids)
+                with open(self._path(LISTS_FILE), "ab") as f:
+                    f.write(clusters.tobytes())
+                lists = _extend_lists(lists, clusters, len(assign))
+                assign = np.concatenate([assign, clusters])
+
+            self._meta.extend(lines)
+            self._digests |= new
+            self._state = (self._map(len(self._meta)), assign, centroids, lists)
+            self._maybe_train()
+            return len(keep)
+
+    def _maybe_train(self):
+        """
+        Starts (re)clustering on its own thread once the index is big enough, or
+        has outgrown its clustering. Caller holds self._lock. Until the new
+        clustering is swapped in, queries keep using the previous one.
+        """
+        vectors = self._state[0]
+        if len(vectors) < IVF_MIN_ROWS or len(vectors) < self._trained_rows * IVF_RETRAIN_GROWTH:
+            return
+        if self._trainer is None or not self._trainer.is_alive():
+            self._trainer = threading.Thread(target=self._train, name="similarity-train", daemon=True)
+            self._trainer.start()
+
+    def _train(self):
+        try:
+            # k-means and the bulk assignment run without the lock, so add() (the log writer's flush) never waits.
+            vectors = self._state[0]
+            rng = np.random.default_rng(len(vectors))
+            sample = vectors[np.sort(rng.choice(len(vectors), min(IVF_SAMPLE, len(vectors)), replace=False))]
+            centroids = _kmeans(np.asarray(sample), k=int(np.sqrt(len(vectors))))
+            assign = _assign(vectors, centroids)
+
+            with self._lock, self._file_lock():
+                current = self._state[0]
+                if len(current) < len(vectors):
+                    return  # the index was reset meanwhile
+                if len(current) > len(vectors):  # rows added while training
+                    assign = np.concatenate([assign, _assign(current[len(vectors):], centroids)])
+                # Written to temp names and swapped in, so a crash leaves the old clustering intact.
+                for name, array in ((CENTROIDS_FILE, centroids), (LISTS_FILE, assign)):
+                    array.tofile(self._path(name) + ".tmp")
+                with open(self._path(IVF_FILE) + ".tmp", "w") as f:
+                    json.dump({"trained_rows": len(current), "clusters": len(centroids)}, f)
+                for name in (CENTROIDS_FILE, LISTS_FILE, IVF_FILE):
+                    os.replace(self._path(name) + ".tmp", self._path(name))
+                self._trained_rows = len(current)
+                self._state = (current, assign, centroids, _cluster_lists(assign, len(centroids)))
+        except Exception as e:
+            print(f"❌ Similarity index training failed: {e}")
+
+    def wait_trained(self):
+        """Blocks until a running (re)clustering has been swapped in (scripts and benchmarks)."""
+        trainer = self._trainer
+        if trainer is not None:
+            trainer.join()
+
+    def nearest(self, queries):
+        """(best row, best score) per query row; row is -1 when nothing was scanned."""
+        vectors, _, centroids, lists = self._state  # snapshot: writers swap in a new state, never mutate it
+        queries = np.asarray(queries, dtype=np.float32)
+        if not len(vectors):
+            return np.full(len(queries), -1), np.zeros(len(queries), dtype=np.float32)
+        if centroids is None:
+            scores = queries @ vectors.T
+            best = scores.argmax(axis=1)
+            return best, scores[np.arange(len(best)), best]
+
+        probes = np.argsort(-(queries @ centroids.T), axis=1)[:, :self.probes]
+        rows_out, scores_out = np.full(len(queries), -1), np.zeros(len(queries), dtype=np.float32)
+        for i, (query, probe) in enumerate(zip(queries, probes)):
+            # Only the probed clusters' inverted lists: O(rows scanned), not O(rows indexed)
+            rows = np.sort(np.concatenate([lists[c] for c in probe]))
+            if len(rows):
+                scores = vectors[rows] @ query
+                best = scores.argmax()
+                rows_out[i], scores_out[i] = rows[best], scores[best]
+        return rows_out, scores_out
+
+    def meta(self, row):
+        return json.loads(self._meta[row])
+
+
+class SimilarityDetector:
+    """
+    Flags prompts whose embedding is close to a previously logged attack.
+    Seeded once from high-risk logs rows, then learns from every new
+    high-risk log the writer flushes. Inactive until load() has run.
+    """
+
+    def __init__(self, directory=SIMILARITY_DIR, dim=SIMILARITY_DIM, threshold=SIMILARITY_THRESHOLD,
+                 min_risk=SIMILARITY_MIN_RISK):
+        self.vectorizer = HashingVectorizer(dim)
+        self.index = VectorIndex(directory, dim)
+        self.threshold = threshold
+        self.min_risk = min_risk
+        self.ready = False
+        self.database = None
+        self._closing = threading.Event()
+
+    def load(self, database=None, chunk_size=1000):
+        """Maps the persisted index; on first run seeds it from the logs table (close() cuts that short)."""
+        self.database = database
+        self.index.open()
+        if database is not None and not len(self.index):
+            after = 0
+            while not self._closing.is_set():
+                rows = database.query(
+                    "SELECT rowid, id, message, risk_score, threat_categories FROM logs "
+                    "WHERE rowid > ? AND risk_score >= ? ORDER BY rowid LIMIT ?",
+                    (after, self.min_risk, chunk_size))
+                self.learn(rows)
+                if len(rows) < chunk_size:
+                    break
+                after = rows[-1]["rowid"]
+        if self._closing.is_set():
+            return
+        self.ready = True
+        print(f"🧭 [SIMILARITY]: {len(self.index)} known attacks indexed")
+
+    def close(self):
+        """Stops a seeding load() at its next chunk (shutdown); rows already added stay indexed."""
+        self._closing.set()
+
+    def learn(self, records):
+        """Adds high-risk log records (dicts with id, message, risk_score, threat_categories)."""
+        vectors, metas, digests = [], [], []
+        for r in records:
+            try:
+                categories = json.loads(r.get("threat_categories") or "[]")
+            except (TypeError, ValueError):
+                categories = []
+            # Don't learn from our own verdicts, or the library drifts towards whatever it already flags.
+            if (r.get("risk_score") or 0) < self.min_risk or not r.get("message") or SIMILAR_CATEGORY in categories:
+                continue
+            view = normalize(r["message"])
+            vectors.append(self.vectorizer.transform(view))
+            metas.append({"log_id": r.get("id"), "categories": categories, "risk": r["risk_score"],
+                          "preview": r["message"][:80]})
+            digests.append(int.from_bytes(hashlib.blake2b(view.encode(), digest_size=8).digest(), "little"))
+        added = self.index.add(vectors, metas, digests) if vectors else 0
+        if added and self.ready and self.database is not None:
+            self.database.notify_change("similarity")  # other workers remap the grown index
+        return added
+
+    def on_logged(self, records):
+        """LogWriter listener: learns from freshly committed logs once the index is loaded."""
+        if self.ready:
+            self.learn(records)
+
+    def refresh(self):
+        if self.ready:
+            self.index.refresh()
+
+    def check(self, text):
+        """Returns the nearest known attack as a SimilarMatch if it clears the threshold, else None."""
+        return self.check_many([text])[0]
+
+    def check_many(self, texts):
+        if not self.ready or not texts:
+            return [None] * len(texts)
+        results = []
+        for i in range(0, len(texts), QUERY_CHUNK):
+            chunk = np.stack([self.vectorizer.transform(normalize(t)) for t in texts[i:i + QUERY_CHUNK]])
+            rows, scores = self.index.nearest(chunk)
+            for row, score in zip(rows, scores):
+                if row < 0 or score < self.threshold:
+                    results.append(None)
+                    continue
+                m = self.index.meta(row)
+                results.append(SimilarMatch(round(float(score), 3), m["log_id"], m["categories"], m["risk"],
+                                            m["preview"]))
+        return results
+
+    def stats(self):
+        return {"ready": self.ready, "attacks": len(self.index), "threshold": self.threshold}
+
+
+def get_detector():
+    """The detector when SIMILARITY_DETECTOR=1 and NumPy is installed, else None."""
+    if not SIMILARITY_ENABLED:
+        return None
+    if np is None:
+        print("❌ SIMILARITY_DETECTOR=1 but NumPy is not installed; similarity detection is off.")
+        return None
+    return SimilarityDetector()
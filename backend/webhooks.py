@@ -0,0 +1,247 @@
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+# --- WEBHOOK DELIVERY CONFIGURATION ---
+# Alerts reach the webhook_outbox table in the same transaction that stores
+# them (Database.insert_alerts); this worker drains it in the background, so
+# delivery never sits on the /api/chat path.
+WEBHOOK_POLL_INTERVAL = float(os.environ.get("WEBHOOK_POLL_INTERVAL", "0.25"))  # seconds between outbox checks
+WEBHOOK_BATCH_SIZE = int(os.environ.get("WEBHOOK_BATCH_SIZE", "100"))           # alerts per POST
+WEBHOOK_MAX_CONCURRENCY = int(os.environ.get("WEBHOOK_MAX_CONCURRENCY", "8"))   # POSTs in flight per worker
+WEBHOOK_TIMEOUT = float(os.environ.get("WEBHOOK_TIMEOUT", "5"))                 # seconds per POST
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get("WEBHOOK_MAX_ATTEMPTS", "8"))         # then the row is marked dead
+WEBHOOK_BACKOFF_BASE = float(os.environ.get("WEBHOOK_BACKOFF_BASE", "1"))       # seconds before the first retry
+WEBHOOK_BACKOFF_MAX = float(os.environ.get("WEBHOOK_BACKOFF_MAX", "300"))       # cap on any single retry delay
+# A claimed row is hidden from other workers this long; if the claiming worker
+# dies mid-delivery the row simply becomes due again.
+WEBHOOK_LEASE = WEBHOOK_TIMEOUT * 2 + 5
+
+EVENT_NAME = "honeyprompt.alerts"
+
+
+def backoff_delay(attempts, base=WEBHOOK_BACKOFF_BASE, cap=WEBHOOK_BACKOFF_MAX):
+    """Exponential backoff with full jitter: a random delay up to base * 2^(attempts-1), capped."""
+    return random.uniform(0, min(cap, base * 2 ** max(0, attempts - 1)))
+
+
+class WebhookDispatcher:
+    """
+    Background worker that delivers queued alerts to their webhooks.
+    Each poll claims the due outbox rows, groups them per endpoint and sends
+    every group as one POST ({"event", "webhook", "alerts": [...]}). 2xx
+    deletes the rows; anything else schedules a retry with backoff, until
+    WEBHOOK_MAX_ATTEMPTS marks them dead. One batch per endpoint is in flight
+    at a time, and at most `max_concurrency` POSTs overall.
+    """
+
+    def __init__(self, database, batch_size=WEBHOOK_BATCH_SIZE, max_concurrency=WEBHOOK_MAX_CONCURRENCY,
+                 timeout=WEBHOOK_TIMEOUT, max_attempts=WEBHOOK_MAX_ATTEMPTS, poll_interval=WEBHOOK_POLL_INTERVAL):
+        self.db = database
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._client = None
+        self._task = None
+        self._stopping = asyncio.Event()
+        self._inflight = {}  # webhook_id -> delivery task
+        self._db_calls = set()  # outbox statements running in worker threads
+        self.delivered = 0
+        self.posts = 0
+        self.failures = 0
+        self.dead = 0
+
+    @property
+    def in_flight(self):
+        return len(self._inflight)
+
+    async def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    def _get_client(self):
+        # Created (and httpx imported) on the first delivery: most starts have nothing to send.
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+            )
+        return self._client
+
+    async def stop(self):
+        """Stops polling and waits for outbox statements already running, so the database can be closed."""
+        if self._task:
+            self._stopping.set()  # the loop exits after its current poll, never mid-statement
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._inflight:
+            # Let running POSTs finish; anything unfinished is re-sent once its lease expires.
+            pending = (await asyncio.wait(list(self._inflight.values()), timeout=self.timeout))[1]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._db_calls:
+            await asyncio.gather(*self._db_calls, return_exceptions=True)
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                claimed = await self.poll()
+            except Exception as e:
+                print(f"❌ Webhook outbox poll failed: {e}")
+                claimed = 0
+            if not claimed:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _db(self, fn, *args):
+        """
+        Runs an outbox statement in a worker thread. Cancelling the caller does
+        not abandon the thread: stop() waits for every call still running.
+        """
+        call = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        self._db_calls.add(call)
+        call.add_done_callback(self._db_calls.discard)
+        return await asyncio.shield(call)
+
+    async def poll(self):
+        """Claims due rows for idle endpoints and starts their deliveries. Returns the number claimed."""
+        free = self.max_concurrency - len(self._inflight)
+        if free <= 0:
+            return 0
+        rows = await self._db(self._claim, list(self._inflight), self.batch_size * free)
+        if not rows:
+            return 0
+        groups = {}
+        for row in rows:
+            groups.setdefault(row["webhook_id"], []).append(row)
+        hooks = await self._db(self._load_hooks, list(groups))
+        gone, spare = [], []
+        for webhook_id, group in groups.items():
+            hook = hooks.get(webhook_id)
+            if hook is None:
+                gone.extend(r["id"] for r in group)  # webhook deleted or disabled since the alert was queued
+                continue
+            if free <= 0:
+                spare.extend(r["id"] for r in group)
+                continue
+            # One POST per endpoint per claim, so every lease covers a single request.
+            spare.extend(r["id"] for r in group[self.batch_size:])
+            task = asyncio.create_task(self._deliver(hook, group[:self.batch_size]))
+            self._inflight[webhook_id] = task
+            task.add_done_callback(lambda _, key=webhook_id: self._inflight.pop(key, None))
+            free -= 1
+        if gone or spare:
+            await self._db(self._release, gone, spare)
+        return len(rows)
+
+    async def drain(self, timeout=None):
+        """Delivers until no pending rows are left, retries included (scripts and benchmarks)."""
+        deadline = time.monotonic() + timeout if timeout else None
+        while not deadline or time.monotonic() < deadline:
+            claimed = await self.poll()
+            if self._inflight:
+                await asyncio.wait(list(self._inflight.values()), return_when=asyncio.FIRST_COMPLETED)
+            elif not claimed:
+                if not (await self._db(self.outbox_counts)).get("pending"):
+                    return
+                await asyncio.sleep(self.poll_interval)  # only retries not yet due
+
+    async def _deliver(self, hook, rows):
+        import httpx
+        body = {"event": EVENT_NAME, "webhook": hook["name"], "sent_at": datetime.now().isoformat(),
+                "alerts": [json.loads(r["payload"]) for r in rows]}
+        error = None
+        async with self._slots:
+            try:
+                resp = await self._get_client().post(hook["url"], json=body)
+                if resp.status_code >= 300:
+                    error = f"HTTP {resp.status_code}"
+            except httpx.HTTPError as e:
+                error = str(e) or type(e).__name__
+        self.posts += 1
+        try:
+            await self._db(self._settle, rows, error)
+        except Exception as e:
+            print(f"❌ Webhook outbox update failed for {hook['name']}: {e}")
+        if error:
+            self.failures += 1
+            print(f"❌ Webhook '{hook['name']}' delivery failed ({len(rows)} alerts): {error}")
+        else:
+            self.delivered += len(rows)
+
+    # --- OUTBOX STORAGE (worker threads) ---
+    def _claim(self, busy_webhooks, limit):
+        """Leases up to `limit` due rows in one statement, so concurrent workers never claim the same row."""
+        now = time.time()
+        skip = ""
+        if busy_webhooks:
+            skip = f" AND webhook_id NOT IN ({', '.join('?' * len(busy_webhooks))})"
+        sql = (f"UPDATE webhook_outbox SET next_attempt_at = ? WHERE id IN ("
+               f"SELECT id FROM webhook_outbox WHERE status = 'pending' AND next_attempt_at <= ?{skip} "
+               f"ORDER BY next_attempt_at, id LIMIT ?) "
+               f"RETURNING id, webhook_id, payload, attempts")
+        rows = self.db.query(sql, [now + WEBHOOK_LEASE, now, *busy_webhooks, limit])
+        rows.sort(key=lambda r: r["id"])  # RETURNING order is unspecified; keep alerts in arrival order
+        return rows
+
+    def _load_hooks(self, webhook_ids):
+        marks = ", ".join("?" * len(webhook_ids))
+        rows = self.db.query(f"SELECT id, name, url FROM webhooks WHERE is_active = 1 AND id IN ({marks})",
+                             webhook_ids)
+        return {r["id"]: r for r in rows}
+
+    def _delete(self, ids):
+        self.db.executemany("DELETE FROM webhook_outbox WHERE id = ?", [(i,) for i in ids])
+
+    def _release(self, gone, spare):
+        """Drops rows whose webhook is gone and hands claimed-but-unsent rows back, due ahead of newer rows."""
+        with self.db.transaction() as conn:
+            conn.executemany("DELETE FROM webhook_outbox WHERE id = ?", [(i,) for i in gone])
+            conn.executemany("UPDATE webhook_outbox SET next_attempt_at = ? WHERE id = ?", [(0, i) for i in spare])
+
+    def _settle(self, rows, error):
+        if error is None:
+            self._delete([r["id"] for r in rows])
+            return
+        now, retry, dead = time.time(), [], []
+        for r in rows:
+            attempts = r["attempts"] + 1
+            if attempts >= self.max_attempts:
+                dead.append((attempts, error, r["id"]))
+            else:
+                retry.append((attempts, now + backoff_delay(attempts), error, r["id"]))
+        with self.db.transaction() as conn:
+            conn.executemany("UPDATE webhook_outbox SET attempts = ?, next_attempt_at = ?, last_error = ? "
+                             "WHERE id = ?", retry)
+            conn.executemany("UPDATE webhook_outbox SET status = 'dead', attempts = ?, last_error = ? "
+                             "WHERE id = ?", dead)
+        self.dead += len(dead)
+
+    def outbox_counts(self):
+        rows = self.db.query("SELECT status, COUNT(*) AS n FROM webhook_outbox GROUP BY status")
+        return {r["status"]: r["n"] for r in rows}
+
+    def stats(self):
+        return {
+            "delivered": self.delivered,
+            "posts": self.posts,
+            "failures": self.failures,
+            "dead": self.dead,
+            "in_flight": self.in_flight,
+            "outbox": self.outbox_counts(),
+        }
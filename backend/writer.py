@@ -0,0 +1,128 @@
+import asyncio
+import time
+from database import db
+from metrics import LOG_FLUSHES, LOG_RECORDS
+
+# --- WRITE-BEHIND TUNING ---
+MAX_QUEUE = 10000        # records held before producers start waiting (backpressure)
+BATCH_SIZE = 500         # flush as soon as this many records are queued...
+FLUSH_INTERVAL = 0.005   # ...or this many seconds after the first one arrived
+
+_STOP = object()
+
+
+class LogWriter:
+    """
+    Background writer for the logs and alerts tables.
+    Request handlers only enqueue a record; a single asyncio task drains the
+    queue and writes each batch with executemany in one transaction, off the
+    event loop thread. Started and stopped from the FastAPI lifespan.
+    """
+
+    def __init__(self, database, max_queue=MAX_QUEUE, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.db = database
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = None
+        self._task = None
+        self._listeners = []
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    @property
+    def queued(self):
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flushes everything still queued, then stops the worker."""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def join(self):
+        """Waits until every record queued so far has been written."""
+        if self.running:
+            await self._queue.join()
+
+    def add_listener(self, callback):
+        """Calls callback(log_records) from the flush thread after each batch is committed."""
+        self._listeners.append(callback)
+
+    async def log(self, record):
+        await self._submit("logs", record)
+
+    async def alert(self, record):
+        await self._submit("alerts", record)
+
+    async def _submit(self, table, record):
+        if not self.running:
+            # No worker (e.g. a script importing the app): write through directly.
+            self._flush([(table, record)])
+            return
+        await self._queue.put((table, record))  # waits here when the queue is full
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                await asyncio.to_thread(self._flush, batch)
+            except Exception as e:
+                print(f"❌ Log writer flush failed ({len(batch)} records dropped): {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _flush(self, batch):
+        logs = [record for table, record in batch if table == "logs"]
+        alerts = [record for table, record in batch if table == "alerts"]
+        start = time.perf_counter()
+        with self.db.transaction():
+            self.db.insert_logs(logs)
+            self.db.insert_alerts(alerts)
+        LOG_FLUSHES.observe(time.perf_counter() - start)
+        LOG_RECORDS.inc("logs", amount=len(logs))
+        LOG_RECORDS.inc("alerts", amount=len(alerts))
+        for callback in self._listeners:
+            try:
+                callback(logs)
+            except Exception as e:
+                print(f"❌ Log writer listener failed: {e}")
+
+
+log_writer = LogWriter(db)
@@ -33,6 +33,12 @@ export const alertsAPI = {
   markAllRead: () => api.post('/alerts/read-all'),
 };
 
+// --- LIVE FEED (Server-Sent Events, replaces polling) ---
+export const eventsAPI = {
+  // GET /api/events -> "ready", "alert" (new alert) and "stats" (counter deltas) events
+  connect: () => new EventSource(`${API_URL}/events`),
+};
+
 // --- ATTACK LOGS (For the Table) ---
 export const attacksAPI = {
   // GET /api/attacks -> Returns full log history
@@ -4,27 +4,102 @@ import {
   PieChart, Pie, Cell, BarChart, Bar 
 } from 'recharts';
 import { Shield, AlertTriangle, Activity, Users, Lock } from 'lucide-react';
-import { dashboardAPI } from '../lib/api';
+import { dashboardAPI, alertsAPI, eventsAPI } from '../lib/api';
 import './Dashboard.css';
 
 const COLORS = ['#06b6d4', '#facc15', '#ef4444', '#10b981'];
+const RECENT_ALERTS = 5;
+const POLL_INTERVAL_MS = 10000; // fallback while the live feed is down
+const READY_TIMEOUT_MS = 3000;  // load the snapshot anyway if the feed has not said 'ready' by then
+
+// Adds a "stats" event from /api/events to the snapshot from /api/dashboard/stats.
+function applyDelta(stats, delta) {
+  if (!stats) return stats;
+  const total = stats.total_attacks + delta.total_attacks;
+  const highRisk = stats.high_risk_attacks + delta.high_risk_attacks;
+  const categories = stats.category_breakdown.map(c => ({ ...c, count: c.count + (delta.categories[c.category] || 0) }));
+  Object.entries(delta.categories).forEach(([category, count]) => {
+    if (!categories.some(c => c.category === category)) categories.push({ category, count });
+  });
+  return {
+    ...stats,
+    total_attacks: total,
+    high_risk_attacks: highRisk,
+    daily_trend: stats.daily_trend.map(d => ({ ...d, attacks: d.attacks + (delta.days[d.date] || 0) })),
+    category_breakdown: categories,
+    risk_distribution: [{ range: "Critical", count: highRisk }, { range: "Low", count: total - highRisk }],
+  };
+}
 
 export default function Dashboard() {
   const [stats, setStats] = useState(null);
+  const [alerts, setAlerts] = useState([]);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
+    // Subscribe first, then take the snapshot (see /api/events). Deltas that arrive while the
+    // snapshot is loading are buffered and added on top of it, so none fall between the two.
+    let fetching = false;
+    let again = false;  // a snapshot was asked for while one was in flight (that one may predate the feed)
+    let buffered = { stats: [], alerts: [] };
+
     async function loadStats() {
+      if (fetching) { again = true; return; }
+      fetching = true;
+      buffered = { stats: [], alerts: [] };
       try {
-        const res = await dashboardAPI.stats();
-        setStats(res.data);
+        const [res, recent] = await Promise.all([dashboardAPI.stats(), alertsAPI.list({ limit: RECENT_ALERTS })]);
+        setStats(buffered.stats.reduce(applyDelta, res.data));
+        const ids = new Set(buffered.alerts.map(a => a.id));
+        setAlerts([...buffered.alerts, ...recent.data.alerts.filter(a => !ids.has(a.id))].slice(0, RECENT_ALERTS));
       } catch (err) {
         console.error("Failed to load dashboard stats", err);
+        const missed = buffered;
+        setStats(s => missed.stats.reduce(applyDelta, s));
+        setAlerts(a => [...missed.alerts, ...a].slice(0, RECENT_ALERTS));
       } finally {
+        fetching = false;
         setLoading(false);
+        if (again) { again = false; loadStats(); }
       }
     }
-    loadStats();
+
+    let poll = null;
+    const startPolling = () => { if (!poll) poll = setInterval(loadStats, POLL_INTERVAL_MS); };
+    const stopPolling = () => { clearInterval(poll); poll = null; };
+
+    let feed = null;
+    try {
+      feed = eventsAPI.connect();
+    } catch (err) {
+      console.error("Live feed unavailable, polling instead", err);
+      loadStats();
+      startPolling();
+      return stopPolling;
+    }
+    // Falls back to snapshot + polling (once; EventSource keeps retrying on its own).
+    const fallBack = () => { if (!poll) { loadStats(); startPolling(); } };
+    // The snapshot never waits on the feed for long: no 'ready' in time means load and poll.
+    const readyTimer = setTimeout(fallBack, READY_TIMEOUT_MS);
+    feed.addEventListener('ready', () => {
+      // (Re)connected: take a fresh snapshot (deltas sent while disconnected are lost), then stop polling.
+      clearTimeout(readyTimer);
+      stopPolling();
+      loadStats();
+    });
+    feed.addEventListener('stats', (e) => {
+      const delta = JSON.parse(e.data);
+      if (fetching) buffered.stats.push(delta);
+      else setStats(s => applyDelta(s, delta));
+    });
+    feed.addEventListener('alert', (e) => {
+      const alert = JSON.parse(e.data);
+      if (fetching) buffered.alerts.unshift(alert);
+      else setAlerts(a => [alert, ...a].slice(0, RECENT_ALERTS));
+    });
+    // Proxy without SSE support, server restart, ...: poll until the feed is back.
+    feed.onerror = () => { clearTimeout(readyTimer); fallBack(); };
+    return () => { clearTimeout(readyTimer); feed.close(); stopPolling(); };
   }, []);
 
   if (loading) return <div className="p-8 text-white">Loading Security Core...</div>;
@@ -132,10 +207,21 @@ export default function Dashboard() {
         <div className="chart-card wide">
           <h3>Recent High Risk Alerts</h3>
           <div className="alerts-list-dashboard">
-            {/* We fetch specific alerts or mock top ones if API is separate */}
-             <p style={{color:'#64748b', fontSize:'0.9rem', padding:'20px'}}>
-               See "Attack Logs" page for detailed breakdown.
-             </p>
+            {alerts.length === 0 ? (
+              <p style={{color:'#64748b', fontSize:'0.9rem', padding:'20px'}}>
+                No alerts yet. See "Attack Logs" page for detailed breakdown.
+              </p>
+            ) : alerts.map(alert => (
+              <div key={alert.id} style={{borderBottom:'1px solid #334155', padding:'10px 0'}}>
+                <div style={{display:'flex', justifyContent:'space-between', color:'#f59e0b', fontSize:'0.9rem'}}>
+                  <span>{alert.message_preview}</span>
+                  <span>RISK: {alert.risk_score}</span>
+                </div>
+                <div style={{fontSize:'0.8rem', color:'#64748b', marginTop:'4px'}}>
+                  {alert.user_email} · {new Date(alert.timestamp).toLocaleTimeString()}
+                </div>
+              </div>
+            ))}
           </div>
         </div>
 